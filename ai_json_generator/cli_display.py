@@ -114,6 +114,10 @@ class CLIDisplay:
         if self.debug_mode:
             self.logger.debug(f"[dim]🔍[/dim] {message}", extra={"markup": True})
     
+    def is_debug(self) -> bool:
+        """Whether debug messages are shown; lets callers skip building them."""
+        return self.debug_mode
+    
     def print_header(self, title: str, subtitle: Optional[str] = None):
         """Print a beautiful header."""
         if self.quiet:
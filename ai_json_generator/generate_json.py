@@ -2,30 +2,53 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import datetime
+import errno
 import json
 import os
 import sys
 import logging
 import time
+import collections
+import functools
+import itertools
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import re
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Mapping
 from rich.logging import RichHandler
-from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.console import Console
 import csv
 import subprocess
 import tempfile
+import shlex
 import shutil
 import site
 import io
-from contextlib import redirect_stdout, redirect_stderr
-from jinja2 import Template, Environment, FileSystemLoader
-import importlib
-from importlib import import_module
-import importlib.resources as pkg_resources
+import stat
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor, wait
+from jinja2 import Template, Environment
+import importlib.resources
 from .cli_display import CLIDisplay, setup_display, get_display
 
+try:
+    import orjson
+except ImportError:  # optional, speeds up parsing of streamed chunks
+    orjson = None
+
+try:
+    import tiktoken
+except ImportError:  # optional, calibrates the token estimate
+    tiktoken = None
+
+try:
+    import charset_normalizer
+except ImportError:  # optional (installed with requests), detects non-UTF-8 CSV encodings
+    charset_normalizer = None
+
 # Initialize Rich Console
 console = Console()
 
@@ -38,6 +61,261 @@ logging.basicConfig(
 )
 logger = logging.getLogger('json_generator')
 
+# Characters that are not allowed in file names, mapped to '_'
+_FN_SANITIZE = str.maketrans({c: '_' for c in '\\/:*?"<>|'})
+# Characters replaced in batch test point directory names
+_DIR_NAME_SANITIZE_RE = re.compile(r'[^\w\-_\.]')
+
+# Patterns used by _fix_malformed_json; [^\S\n] is whitespace other than a newline
+# Code block delimiter lines: ```, ```json or ``` json
+_RE_FENCE_LINE = re.compile(r'^[^\S\n]*```(?: ?json)?[^\S\n]*(?:\n|$)', re.MULTILINE)
+# One token per match, scanned left to right: a (possibly unterminated) string, a
+# single-quoted string as in a Python dict, or a bare word running up to the next
+# structural character or newline. Bare words never start with a single quote, so
+# an unterminated one is left alone and the parse fails. Structural characters and
+# whitespace between tokens are left as they are.
+_RE_JSON_TOKEN = re.compile(
+    r'(?P<string>"(?:[^"\\]|\\.)*"?)'
+    r"|(?P<single>'(?:[^'\\]|\\.)*')"
+    r'|(?P<bare>[^{}\[\]:,"\'\s](?:[^{}\[\]:,"\n]*[^{}\[\]:,"\s])?)',
+    re.DOTALL
+)
+# Inside a single-quoted string: an escape sequence, or a double quote to escape
+_RE_SINGLE_QUOTED_PART = re.compile(r'\\(.)|"', re.DOTALL)
+# Bare words that are already valid JSON values
+_RE_JSON_LITERAL = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+
+
+def _requote_single_quoted(part) -> str:
+    escaped = part.group(1)
+    if escaped is None:
+        return '\\"'
+    # \' only exists to escape the single quote; other escapes are kept for JSON
+    return "'" if escaped == "'" else '\\' + escaped
+
+def _quote_bare_word(match) -> str:
+    single = match.group('single')
+    if single is not None:
+        return '"' + _RE_SINGLE_QUOTED_PART.sub(_requote_single_quoted, single[1:-1]) + '"'
+    word = match.group('bare')
+    if word is None or _RE_JSON_LITERAL.fullmatch(word):
+        return match.group(0)
+    return json.dumps(word, ensure_ascii=False)
+
+# json.loads accepts bytes too, so both parse raw SSE payloads without decoding first.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the latter.
+_loads = orjson.loads if orjson else json.loads
+
+
+def _dumps(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            # Non-string keys are converted as json.dumps does, e.g. the None key
+            # csv.DictReader uses for extra cells in a row
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _dumps_pretty(obj) -> bytes:
+    """Serialize to UTF-8 JSON bytes indented by two spaces, as json.dumps(indent=2) does."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson.JSONEncodeError: integers beyond 64 bits, for example
+            pass
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+# Read size for streamed responses. Chunked SSE responses still yield each
+# chunk as soon as it arrives; the size only caps how much one read returns.
+_SSE_CHUNK_SIZE = 64 * 1024
+
+def _iter_sse(response):
+    """Yield the parsed JSON payload of each ``data:`` line in a streamed response."""
+    for line in response.iter_lines(chunk_size=_SSE_CHUNK_SIZE, decode_unicode=False):
+        if not line:
+            continue
+        if line.startswith(b'data:'):
+            line = line[5:].lstrip()
+        if line == b'[DONE]':
+            break
+        try:
+            yield _loads(line)
+        except ValueError:
+            # Keep-alive comments and other non-JSON lines
+            continue
+
+# Triple backtick code blocks: ```json, ``` json or a bare ```
+_CODE_BLOCK_RE = re.compile(r'```[^\S\n]*(?:json)?[^\S\n]*(.*?)```', re.DOTALL | re.IGNORECASE)
+
+# JSON content between the output markers requested by the prompts
+_JSON_MARKERS_RE = re.compile(r'用例IR JSON如下\s*(.*?)\s*JSON输出完毕', re.DOTALL)
+
+_JSON_DECODER = json.JSONDecoder()
+
+def _first_json_object(text: str) -> Optional[Tuple[str, Any]]:
+    """Return the JSON object starting at the first '{' in text and its parsed value, ignoring anything after it."""
+    start = text.find('{')
+    if start == -1:
+        return None
+    try:
+        parsed, end = _JSON_DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        return None
+    return text[start:end], parsed
+
+# Number of times a single LLM request is sent when it fails with a retryable error
+_LLM_REQUEST_ATTEMPTS = 3
+
+# Tokenize one request in this many to calibrate the characters-per-token ratio
+_TOKEN_SAMPLE_EVERY = 10
+
+@functools.lru_cache(maxsize=None)
+def _get_encoder(model: str):
+    """Return a cached tiktoken encoder for the model, or None when unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        logger.debug(f"Tokenizer unavailable, estimating tokens from length: {e}")
+        return None
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+def _get_session() -> requests.Session:
+    """Return the process-wide HTTP session, so connections are kept alive across requests and generators."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            # Only pool connections here; failed requests are retried, with backoff,
+            # by LLMJsonGenerator._query_llm_with_retry alone
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _SESSION = session
+        return _SESSION
+
+# Shared Jinja2 environment; compiled templates are reused across retries and batch rows
+_JINJA_ENV = Environment()
+
+@functools.lru_cache(maxsize=128)
+def _get_compiled_template(source: str) -> Template:
+    """Compile a Jinja2 template source once and reuse it for later renders."""
+    return _JINJA_ENV.from_string(source)
+
+# Longest value that is still considered as a possible file path
+_MAX_PATH_LENGTH = 4096
+
+@functools.lru_cache(maxsize=256)
+def _read_text_file_cached(path: str, mtime: float) -> str:
+    """Read a text file; the mtime argument makes a changed file miss the cache."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def _read_text_file(path: str) -> str:
+    """Read a text file, reusing the cached content while its mtime is unchanged."""
+    return _read_text_file_cached(path, os.stat(path).st_mtime)
+
+# Config and template lookups probe several locations; the results are cached
+# per requested path (and working directory, for relative paths) so that
+# creating a generator per test case does not repeat them.
+@functools.lru_cache(maxsize=32)
+def _find_config_file(config_path: str, env_config_path: Optional[str], cwd: str) -> str:
+    """Locate the config file, checking the environment variable, the given path and the package."""
+    # First check if environment variable is set
+    if env_config_path and os.path.isfile(env_config_path):
+        config_file = env_config_path
+        logger.debug(f"Using config file from environment variable: {config_file}")
+    # Check if config file exists with absolute path
+    elif os.path.isabs(config_path) and os.path.isfile(config_path):
+        config_file = config_path
+        logger.debug(f"Using config file from absolute path: {config_file}")
+    # Check relative to current directory
+    elif os.path.isfile(config_path):
+        config_file = config_path
+        logger.debug(f"Using config file from current directory: {config_file}")
+    # Check in package directory
+    else:
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        # Try config in package directory
+        package_config = os.path.join(package_dir, config_path)
+        if os.path.isfile(package_config):
+            config_file = package_config
+            logger.debug(f"Using config file from package directory: {config_file}")
+        else:
+            # Try config in home directory
+            home_dir = os.path.expanduser("~")
+            home_config = os.path.join(home_dir, '.ai_json_generator', config_path)
+            if os.path.isfile(home_config):
+                config_file = home_config
+                logger.debug(f"Using config file from home directory: {config_file}")
+            else:
+                # Try config in package data
+                try:
+                    import importlib.resources as pkg_resources
+                    with pkg_resources.path('ai_json_generator', config_path) as p:
+                        if os.path.isfile(p):
+                            config_file = str(p)
+                            logger.debug(f"Using config file from package data: {config_file}")
+                        else:
+                            raise FileNotFoundError(f"Config file not found: {config_path}")
+                except ImportError:
+                    # Fallback for Python < 3.7
+                    package_data_config = os.path.join(package_dir, config_path)
+                    if os.path.isfile(package_data_config):
+                        config_file = package_data_config
+                        logger.debug(f"Using config file from package data: {config_file}")
+                    else:
+                        raise FileNotFoundError(f"Config file not found: {config_path}")
+    return config_file
+
+@functools.lru_cache(maxsize=32)
+def _read_config_file(config_file: str) -> Dict[str, Any]:
+    """Parse a config file once per process."""
+    with open(config_file, 'rb') as f:
+        config = _loads(f.read())
+    logger.debug(f"Successfully loaded config from {config_file}")
+    return config
+
+# Template files already located, keyed by (template_path, cwd). Misses are not
+# cached, so a template created later in the run is still found.
+_TEMPLATE_FILE_CACHE: Dict[Tuple[str, str], str] = {}
+
+def _find_template_file(template_path: str, cwd: str) -> Optional[str]:
+    """Locate a template file given as a path or by name in the package prompts."""
+    key = (template_path, cwd)
+    template_file = _TEMPLATE_FILE_CACHE.get(key)
+    if template_file is None:
+        template_file = _search_template_file(template_path)
+        if template_file is not None:
+            _TEMPLATE_FILE_CACHE[key] = template_file
+    return template_file
+
+def _search_template_file(template_path: str) -> Optional[str]:
+    """Search the current directory and the package for a template file."""
+    # First try to find as absolute path or relative to current directory
+    if os.path.isfile(template_path):
+        return template_path
+    # Try to find in package directory
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    template_file = os.path.join(package_dir, '..', template_path)
+    if os.path.isfile(template_file):
+        return template_file
+    # Check in prompts directory within package
+    template_file = os.path.join(package_dir, '..', 'prompts', os.path.basename(template_path))
+    if os.path.isfile(template_file):
+        return template_file
+    return None
+
 class LLMJsonGenerator:
     def __init__(self, config_path="config.json", display: CLIDisplay = None):
         self.display = display or get_display()
@@ -46,6 +324,8 @@ class LLMJsonGenerator:
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.config['api_token']}"
         }
+        self.session = _get_session()
+        self._payload_template = self._build_payload_template()
         
         # Token usage statistics
         self.token_stats = {
@@ -56,91 +336,49 @@ class LLMJsonGenerator:
             'start_time': None,
             'end_time': None
         }
+        # Guards token_stats when generate_batch runs requests concurrently
+        self._stats_lock = threading.Lock()
+        # Characters and tokens of the requests that were tokenized exactly
+        self._sampled_chars = 0
+        self._sampled_tokens = 0
+        
+        # Error message of the most recent failed generate() call
+        self.last_error: Optional[str] = None
+        # Exception and HTTP status code (if any) behind last_error, for deciding whether to retry
+        self.last_exception: Optional[Exception] = None
+        self.last_status_code: Optional[int] = None
+        # Path and serialized content of the most recently generated JSON file
+        self.last_output_file: Optional[str] = None
+        self.last_json_bytes: Optional[bytes] = None
+        
+        # Generator whose statistics also receive this generator's token usage,
+        # e.g. the shared generator that totals a batch
+        self.token_usage_sink: Optional['LLMJsonGenerator'] = None
         
         # Show config info
         self.display.print_config_info(self.config)
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load LLM configuration from JSON file."""
-        # First check if environment variable is set
-        env_config_path = os.environ.get('AI_JSON_GENERATOR_CONFIG')
-        if env_config_path and os.path.isfile(env_config_path):
-            config_file = env_config_path
-            logger.debug(f"Using config file from environment variable: {config_file}")
-        # Check if config file exists with absolute path
-        elif os.path.isabs(config_path) and os.path.isfile(config_path):
-            config_file = config_path
-            logger.debug(f"Using config file from absolute path: {config_file}")
-        # Check relative to current directory
-        elif os.path.isfile(config_path):
-            config_file = config_path
-            logger.debug(f"Using config file from current directory: {config_file}")
-        # Check in package directory
-        else:
-            package_dir = os.path.dirname(os.path.abspath(__file__))
-            # Try config in package directory
-            package_config = os.path.join(package_dir, config_path)
-            if os.path.isfile(package_config):
-                config_file = package_config
-                logger.debug(f"Using config file from package directory: {config_file}")
-            else:
-                # Try config in home directory
-                home_dir = os.path.expanduser("~")
-                home_config = os.path.join(home_dir, '.ai_json_generator', config_path)
-                if os.path.isfile(home_config):
-                    config_file = home_config
-                    logger.debug(f"Using config file from home directory: {config_file}")
-                else:
-                    # Try config in package data
-                    try:
-                        import importlib.resources as pkg_resources
-                        with pkg_resources.path('ai_json_generator', config_path) as p:
-                            if os.path.isfile(p):
-                                config_file = str(p)
-                                logger.debug(f"Using config file from package data: {config_file}")
-                            else:
-                                raise FileNotFoundError(f"Config file not found: {config_path}")
-                    except ImportError:
-                        # Fallback for Python < 3.7
-                        package_data_config = os.path.join(package_dir, config_path)
-                        if os.path.isfile(package_data_config):
-                            config_file = package_data_config
-                            logger.debug(f"Using config file from package data: {config_file}")
-                        else:
-                            raise FileNotFoundError(f"Config file not found: {config_path}")
-        
+        config_file = _find_config_file(config_path, os.environ.get('AI_JSON_GENERATOR_CONFIG'), os.getcwd())
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                logger.debug(f"Successfully loaded config from {config_file}")
-                return config
+            # Copy so that changes to one generator's config do not leak into the cache
+            return dict(_read_config_file(config_file))
         except Exception as e:
             logger.error(f"Failed to load config from {config_file}: {e}")
             raise
     
     def _read_template(self, template_path: str) -> str:
         """Read prompt template from file."""
-        # First try to find as absolute path or relative to current directory
-        if os.path.isabs(template_path) and os.path.isfile(template_path):
-            template_file = template_path
-        elif os.path.isfile(template_path):
-            template_file = template_path
-        else:
-            # Try to find in package directory
-            package_dir = os.path.dirname(os.path.abspath(__file__))
-            template_file = os.path.join(package_dir, '..', template_path)
-            if not os.path.isfile(template_file):
-                # Check in prompts directory within package
-                template_file = os.path.join(package_dir, '..', 'prompts', os.path.basename(template_path))
-                if not os.path.isfile(template_file):
-                    self.display.error(f"Template file not found: {template_path}")
-                    raise FileNotFoundError(f"Template file not found: {template_path}")
+        template_file = _find_template_file(template_path, os.getcwd())
+        if not template_file:
+            self.display.error(f"Template file not found: {template_path}")
+            raise FileNotFoundError(f"Template file not found: {template_path}")
         
         try:
-            with open(template_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                self.display.debug(f"Successfully loaded template from {template_file}")
-                return content
+            content = _load_template(template_file)
+            self.display.debug(f"Successfully loaded template from {template_file}")
+            return content
         except Exception as e:
             self.display.error(f"Failed to read template from {template_file}: {e}")
             raise
@@ -149,14 +387,24 @@ class LLMJsonGenerator:
         """Process replacements and load file contents if value is a file path."""
         processed_replacements = {}
         for key, value in replacements.items():
+            # Multi-line or very long values are content, not paths; skip the stat
+            if not value or '\n' in value or len(value) > _MAX_PATH_LENGTH:
+                processed_replacements[key] = value
+                continue
             # Check if value is a file path
-            if os.path.isfile(value):
-                self.display.debug(f"Treating replacement value for '{key}' as a file path: {value}")
+            try:
+                st = os.stat(value)
+            except (OSError, ValueError):
+                st = None
+            if st is not None and stat.S_ISREG(st.st_mode):
+                debug = self.display.is_debug()
+                if debug:
+                    self.display.debug(f"Treating replacement value for '{key}' as a file path: {value}")
                 try:
-                    with open(value, 'r', encoding='utf-8') as f:
-                        file_content = f.read()
+                    file_content = _read_text_file_cached(value, st.st_mtime)
                     processed_replacements[key] = file_content
-                    self.display.debug(f"Loaded {len(file_content)} characters from file for '{key}'")
+                    if debug:
+                        self.display.debug(f"Loaded {len(file_content)} characters from file for '{key}'")
                 except Exception as e:
                     self.display.error(f"Failed to read file for replacement '{key}': {e}")
                     # Fall back to using the path as the value
@@ -172,32 +420,18 @@ class LLMJsonGenerator:
         
         try:
             # Try Jinja2 template rendering first
-            jinja_template = Template(template)
+            jinja_template = _get_compiled_template(template)
             filled_template = jinja_template.render(**processed_replacements)
             return filled_template
         except Exception as e:
             # Fallback to simple string replacement for backward compatibility
             self.display.debug(f"Jinja2 rendering failed, using simple replacement: {e}")
-            filled_template = template
-            for key, value in processed_replacements.items():
-                placeholder = f"{{{key}}}"
-                filled_template = filled_template.replace(placeholder, value)
-            return filled_template
+            return _fill_placeholders(template, processed_replacements)
     
-    def query_llm(self, prompt: str, show_output: bool = True) -> str:
-        """Query the LLM with the given prompt using streaming and displaying thinking process."""
-        import time
-        
-        # Start timing and token counting
-        if self.token_stats['start_time'] is None:
-            self.token_stats['start_time'] = time.time()
-        
-        request_start_time = time.time()
-        self.token_stats['requests_count'] += 1
-        
+    def _build_payload_template(self) -> Dict[str, Any]:
+        """Build the request fields that only depend on the config; query_llm adds the messages."""
         payload = {
             "model": self.config["model"],
-            "messages": [{"role": "user", "content": prompt}],
             "max_tokens": self.config["max_tokens"],
             "temperature": self.config["temperature"],
             "top_p": self.config["top_p"],
@@ -213,73 +447,93 @@ class LLMJsonGenerator:
         if "enable_thinking" in self.config:
             payload["enable_thinking"] = self.config["enable_thinking"]
         
+        # Let providers that support it enforce a JSON object response
+        if self.config.get("json_mode"):
+            payload["response_format"] = {"type": "json_object"}
+        
+        return payload
+    
+    def query_llm(self, prompt: str, show_output: bool = True) -> str:
+        """Query the LLM with the given prompt using streaming and displaying thinking process."""
+        # Start timing and token counting
+        request_start_time = time.time()
+        with self._stats_lock:
+            if self.token_stats['start_time'] is None:
+                self.token_stats['start_time'] = request_start_time
+            self.token_stats['requests_count'] += 1
+        
+        payload = {**self._payload_template, "messages": [{"role": "user", "content": prompt}]}
+        
         try:
             self.display.debug("Sending request to LLM API...")
-            with requests.post(
+            with self.session.post(
                 self.config["api_url"],
                 headers=self.headers,
-                json=payload,
+                data=_dumps(payload),
                 stream=True
             ) as response:
                 response.raise_for_status()
                 
-                thinking_process = []
-                final_response = []
+                # Chunks are written to buffers and their lengths counted as they arrive
+                thinking_buf = io.StringIO()
+                response_buf = io.StringIO()
+                thinking_len = 0
+                response_len = 0
                 is_receiving_content = False
 
                 if show_output:
                     with self.display.create_llm_progress() as progress:
                         progress.update_connecting()
                         
-                        for line in response.iter_lines():
-                            if line:
-                                line_text = line.decode('utf-8').replace('data: ', '')
-                                try:
-                                    data = json.loads(line_text)
-                                except json.JSONDecodeError:
-                                    continue
-                                
-                                reasoning_content = data.get('choices', [{}])[0].get('delta', {}).get('reasoning_content')
-                                if reasoning_content and not is_receiving_content:
-                                    thinking_process.append(reasoning_content)
-                                    progress.update_thinking(reasoning_content)
-
-                                content = data.get('choices', [{}])[0].get('delta', {}).get('content')
-                                if content:
-                                    if not is_receiving_content:
-                                        is_receiving_content = True
-                                        progress.update_generating()
-                                    final_response.append(content)
-
-                                if data.get('choices', [{}])[0].get('finish_reason') == 'stop':
-                                    progress.update_complete()
-                                    break
-                else:
-                    for line in response.iter_lines():
-                        if line:
-                            line_text = line.decode('utf-8').replace('data: ', '')
-                            try:
-                                data = json.loads(line_text)
-                            except json.JSONDecodeError:
-                                continue
-                            reasoning_content = data.get('choices', [{}])[0].get('delta', {}).get('reasoning_content')
-                            if reasoning_content:
-                                thinking_process.append(reasoning_content)
-                            content = data.get('choices', [{}])[0].get('delta', {}).get('content')
+                        for data in _iter_sse(response):
+                            choice = data.get('choices', [{}])[0]
+                            delta = choice.get('delta', {})
+                            
+                            reasoning_content = delta.get('reasoning_content')
+                            if reasoning_content and not is_receiving_content:
+                                thinking_buf.write(reasoning_content)
+                                thinking_len += len(reasoning_content)
+                                progress.update_thinking(reasoning_content)
+
+                            content = delta.get('content')
                             if content:
-                                final_response.append(content)
-                            if data.get('choices', [{}])[0].get('finish_reason') == 'stop':
+                                if not is_receiving_content:
+                                    is_receiving_content = True
+                                    progress.update_generating()
+                                response_buf.write(content)
+                                response_len += len(content)
+
+                            if choice.get('finish_reason') == 'stop':
+                                progress.update_complete()
                                 break
+                else:
+                    for data in _iter_sse(response):
+                        choice = data.get('choices', [{}])[0]
+                        delta = choice.get('delta', {})
+                        reasoning_content = delta.get('reasoning_content')
+                        if reasoning_content:
+                            thinking_buf.write(reasoning_content)
+                            thinking_len += len(reasoning_content)
+                        content = delta.get('content')
+                        if content:
+                            response_buf.write(content)
+                            response_len += len(content)
+                        if choice.get('finish_reason') == 'stop':
+                            break
                 
-                thinking_content = ''.join(thinking_process)
-                response_content = ''.join(final_response)
+                thinking_content = thinking_buf.getvalue()
+                response_content = response_buf.getvalue()
                 
                 # Update token statistics (estimate based on content length)
-                self._update_token_stats(prompt, thinking_content + response_content, request_start_time)
+                input_tokens = self._count_tokens((prompt,), len(prompt))
+                output_tokens = self._count_tokens((thinking_content, response_content), thinking_len + response_len)
+                self._update_token_stats(input_tokens, output_tokens, request_start_time)
                 
-                self.display.debug(f"Received complete response ({len(response_content)} chars)")
+                if self.display.is_debug():
+                    self.display.debug(f"Received complete response ({response_len} chars)")
+                    if thinking_content:
+                        self.display.debug(f"Captured thinking content ({thinking_len} chars)")
                 if thinking_content:
-                    self.display.debug(f"Captured thinking content ({len(thinking_content)} chars)")
                     return f"THINKING:\n{thinking_content}\n\nRESPONSE:\n{response_content}"
                 else:
                     return response_content
@@ -290,33 +544,72 @@ class LLMJsonGenerator:
                 self.display.error(f"Response: {response.text}")
             raise
     
-    def _update_token_stats(self, prompt: str, response: str, request_start_time: float):
-        """Update token statistics based on prompt and response content."""
-        import time
-        
+    def _count_tokens(self, texts: Tuple[str, ...], chars: int) -> int:
+        """Tokenize sampled requests exactly and estimate the others from the sampled ratio."""
+        encoder = _get_encoder(self.config.get("model", ""))
+        if encoder is not None and self.token_stats['requests_count'] % _TOKEN_SAMPLE_EVERY == 1:
+            tokens = sum(len(encoder.encode(text, disallowed_special=())) for text in texts)
+            with self._stats_lock:
+                self._sampled_chars += chars
+                self._sampled_tokens += tokens
+            return tokens
+        with self._stats_lock:
+            if self._sampled_chars:
+                return chars * self._sampled_tokens // self._sampled_chars
         # Rough estimation: 1 token ≈ 4 characters for Chinese, 4 characters for English
-        input_tokens = len(prompt) // 4
-        output_tokens = len(response) // 4
-        
-        self.token_stats['total_input_tokens'] += input_tokens
-        self.token_stats['total_output_tokens'] += output_tokens
-        self.token_stats['total_tokens'] += input_tokens + output_tokens
-        self.token_stats['end_time'] = time.time()
-        
-        request_duration = time.time() - request_start_time
-        self.display.debug(f"Request completed in {request_duration:.2f}s, estimated tokens: {input_tokens} input + {output_tokens} output")
+        return chars // 4
     
-    def get_token_summary(self) -> Dict[str, Any]:
-        """Get a summary of token usage statistics."""
-        stats = self.token_stats.copy()
+    def _query_llm_with_retry(self, prompt: str, show_output: bool = True) -> str:
+        """
+        Query the LLM, repeating the request with backoff only for network errors, 429 and 5xx.
         
-        if stats['start_time'] and stats['end_time']:
-            duration = stats['end_time'] - stats['start_time']
+        This is the only place failed requests are retried; neither the HTTP
+        session nor the callers of generate() retry them again.
+        """
+        for attempt in range(_LLM_REQUEST_ATTEMPTS):
+            try:
+                return self.query_llm(prompt, show_output)
+            except Exception as e:
+                if attempt == _LLM_REQUEST_ATTEMPTS - 1 or not _is_retryable_request_error(e):
+                    raise
+                self.display.warning(f"LLM request failed, retrying ({attempt + 1}/{_LLM_REQUEST_ATTEMPTS - 1}): {e}")
+                _sleep_backoff(attempt)
+    
+    def _update_token_stats(self, input_tokens: int, output_tokens: int, request_start_time: float):
+        """Update token statistics with the token counts of one request."""
+        self._add_token_usage(input_tokens, output_tokens, 0)
+        if self.token_usage_sink is not None:
+            self.token_usage_sink.record_token_usage(input_tokens, output_tokens)
+        
+        if self.display.is_debug():
+            request_duration = time.time() - request_start_time
+            self.display.debug(f"Request completed in {request_duration:.2f}s, estimated tokens: {input_tokens} input + {output_tokens} output")
+    
+    def record_token_usage(self, input_tokens: int, output_tokens: int, requests_count: int = 1):
+        """Add token usage of requests made by another generator to this generator's statistics."""
+        self._add_token_usage(input_tokens, output_tokens, requests_count)
+    
+    def _add_token_usage(self, input_tokens: int, output_tokens: int, requests_count: int):
+        """Update the totals and the derived rates kept in token_stats."""
+        now = time.time()
+        with self._stats_lock:
+            stats = self.token_stats
+            stats['total_input_tokens'] += input_tokens
+            stats['total_output_tokens'] += output_tokens
+            stats['total_tokens'] += input_tokens + output_tokens
+            stats['requests_count'] += requests_count
+            if stats['start_time'] is None:
+                stats['start_time'] = now
+            stats['end_time'] = now
+            
+            duration = now - stats['start_time']
             stats['total_duration_seconds'] = duration
             stats['tokens_per_second'] = stats['total_tokens'] / duration if duration > 0 else 0
             stats['average_tokens_per_request'] = stats['total_tokens'] / stats['requests_count'] if stats['requests_count'] > 0 else 0
-        
-        return stats
+    
+    def get_token_summary(self) -> Mapping[str, Any]:
+        """Get a read-only view of the token usage statistics, which are kept up to date as requests complete."""
+        return types.MappingProxyType(self.token_stats)
     
     def print_token_summary(self):
         """Print a formatted summary of token usage."""
@@ -339,6 +632,11 @@ class LLMJsonGenerator:
     
     def extract_json_content(self, response: str) -> Optional[str]:
         """Extract JSON content from the LLM response."""
+        return self._extract_json(response)[0]
+    
+    def _extract_json(self, response: str) -> Tuple[Optional[str], Optional[Any]]:
+        """Extract JSON content from the LLM response, with its parsed value when it is valid JSON."""
+        debug = self.display.is_debug()
         try:
             # First check if response contains thinking and actual response
             if "THINKING:\n" in response and "\n\nRESPONSE:\n" in response:
@@ -352,101 +650,80 @@ class LLMJsonGenerator:
                 response_part = response
             
             # For the op_testcase.prompt, the JSON will be between "用例IR JSON如下" and "JSON输出完毕"
-            start_marker = "用例IR JSON如下"
-            end_marker = "JSON输出完毕"
-            
-            # Clean up any whitespace or newlines around these markers
-            json_content = ""
-            
-            # First try with markers
-            start_index = response_part.find(start_marker)
-            end_index = response_part.find(end_marker)
-            
-            if start_index != -1 and end_index != -1:
+            match = _JSON_MARKERS_RE.search(response_part)
+            if match:
                 # Extract JSON content between the markers
-                json_content = response_part[start_index + len(start_marker):end_index].strip()
-                self.display.debug(f"Extracted JSON content with markers, found content of length: {len(json_content)}")
+                json_content = match.group(1)
+                if debug:
+                    self.display.debug(f"Extracted JSON content with markers, found content of length: {len(json_content)}")
             else:
-                self.display.debug(f"Could not find JSON markers in response. Start marker: '{start_marker}' found: {start_index != -1}, End marker: '{end_marker}' found: {end_index != -1}")
+                self.display.debug("Could not find JSON markers in response")
                 # If we can't find the markers, use the entire response part
                 json_content = response_part
-                self.display.debug(f"Using full response content of length: {len(json_content)}")
+                if debug:
+                    self.display.debug(f"Using full response content of length: {len(json_content)}")
             
             # Extract any JSON-like content wrapped in code blocks or braces
-            result = self._extract_json_from_text(json_content)
+            result, parsed = self._extract_json_from_text(json_content)
+            if parsed is not None:
+                return result, parsed
             
             # Try to fix malformed JSON as a last resort
-            try:
-                json.loads(result)
-                return result
-            except json.JSONDecodeError:
-                fixed_result = self._fix_malformed_json(result)
+            fixed_result = self._fix_malformed_json(result)
+            if debug:
                 self.display.debug(f"Attempted to fix malformed JSON, result length: {len(fixed_result)}")
-                return fixed_result
+            return fixed_result, None
             
         except Exception as e:
             self.display.error(f"Error extracting JSON content: {e}")
-            return None
+            return None, None
     
     def _extract_code_blocks(self, text: str) -> list:
         """Extract code blocks from markdown text."""
-        code_blocks = []
-        
-        # Look for triple backtick code blocks - various formats
-        # Handle different variations: ```json, ``` json, ```
-        start_patterns = ["```json", "``` json", "```"]
-        end_pattern = "```"
-        
-        for start_pattern in start_patterns:
-            start_idx = 0
-            while True:
-                # Find the start of the code block
-                start_idx = text.find(start_pattern, start_idx)
-                if start_idx == -1:
-                    break
-                
-                # Find the end of the code block
-                end_idx = text.find(end_pattern, start_idx + len(start_pattern))
-                if end_idx == -1:
-                    break
-                
-                # Extract the code block content, excluding the markers
-                code_block = text[start_idx + len(start_pattern):end_idx].strip()
-                
-                # Only add non-empty code blocks
-                if code_block:
-                    code_blocks.append(code_block)
-                
-                # Move past this code block
-                start_idx = end_idx + len(end_pattern)
-        
-        return code_blocks
+        return [block.strip() for block in _CODE_BLOCK_RE.findall(text) if block.strip()]
     
-    def _extract_json_from_text(self, text: str) -> str:
-        """Extract JSON from text. Tries various methods to find valid JSON."""
-        # First try to extract from code blocks
+    def _extract_json_from_text(self, text: str) -> Tuple[str, Optional[Any]]:
+        """
+        Extract JSON from text. Tries various methods to find valid JSON.
+        
+        Returns:
+            The JSON string and its parsed value, or the text and None if no valid JSON was found
+        """
+        # Text that starts with the object, as between the markers, needs a single parse
+        if text.lstrip().startswith('{'):
+            found = _first_json_object(text)
+            if found:
+                self.display.debug("Found valid JSON at the start of the text")
+                return found
+        
+        # Then try to extract from code blocks
         code_blocks = self._extract_code_blocks(text)
         if code_blocks:
-            self.display.debug(f"Found {len(code_blocks)} code blocks")
+            if self.display.is_debug():
+                self.display.debug(f"Found {len(code_blocks)} code blocks")
             # Try each code block to see if it's valid JSON
             for block in code_blocks:
                 try:
                     # Test if it's valid JSON
-                    json.loads(block)
+                    parsed = _loads(block)
                     self.display.debug("Found valid JSON in code block")
-                    return block
+                    return block, parsed
                 except json.JSONDecodeError:
                     # Try to fix common issues with JSON
                     fixed_block = self._fix_malformed_json(block)
                     try:
                         # Test if the fixed block is valid JSON
-                        json.loads(fixed_block)
+                        parsed = _loads(fixed_block)
                         self.display.debug("Found valid JSON after fixing malformed JSON")
-                        return fixed_block
+                        return fixed_block, parsed
                     except json.JSONDecodeError:
                         continue
         
         # If no valid code blocks, try to find JSON directly
+        found = _first_json_object(text)
+        if found:
+            self.display.debug("Found valid JSON at the first brace")
+            return found
         try:
             # Look for {...} pattern
             start_idx = text.find('{')
@@ -456,24 +733,24 @@ class LLMJsonGenerator:
                 json_str = text[start_idx:end_idx+1]
                 # Test if it's valid JSON
                 try:
-                    json.loads(json_str)
+                    parsed = _loads(json_str)
                     self.display.debug("Found valid JSON with brace matching")
-                    return json_str
+                    return json_str, parsed
                 except json.JSONDecodeError:
                     # Try to fix common issues with JSON
                     fixed_json = self._fix_malformed_json(json_str)
                     try:
                         # Test if the fixed JSON is valid
-                        json.loads(fixed_json)
+                        parsed = _loads(fixed_json)
                         self.display.debug("Found valid JSON after fixing malformed JSON with brace matching")
-                        return fixed_json
+                        return fixed_json, parsed
                     except json.JSONDecodeError:
                         pass
         except json.JSONDecodeError:
             pass
         
         # Return the entire text as a last resort
-        return text
+        return text, None
     
     def _fix_malformed_json(self, json_str: str) -> str:
         """
@@ -500,60 +777,48 @@ class LLMJsonGenerator:
             if end_idx != -1:
                 json_str = json_str[:end_idx+1]
         
-        # Fix missing quotes around keys and string values
-        lines = json_str.split('\n')
-        fixed_lines = []
-        
-        in_string = False  # Track if we're inside a quoted string
+        fixed_json = _RE_FENCE_LINE.sub('', json_str)
         
-        for line in lines:
-            # Skip processing if we're confident this is part of a code block delimiter
-            if line.strip() in ['```', '```json', '``` json']:
-                continue
-            
-            # Process line to fix common JSON issues
-            line = line.rstrip()
-            
-            # Fix unquoted keys at the beginning of lines
-            # Pattern: whitespace + word + whitespace + colon
-            line = re.sub(r'(\s*)([a-zA-Z0-9_]+)(\s*):(\s*)', r'\1"\2"\3:\4', line)
-            
-            # Fix string values without quotes
-            # Pattern: colon + whitespace + word + optional comma at end of line
-            line = re.sub(r':(\s*)([a-zA-Z0-9_]+)(\s*)(,?)(\s*)$', r': "\2"\3\4\5', line)
-            
-            # Fix missing quotes in arrays
-            # Special case for unquoted array elements at the beginning
-            line = re.sub(r'\[(\s*)([a-zA-Z0-9_]+)(\s*)(,?)(\s*)', r'[\1"\2"\3\4\5', line)
-            # Special case for unquoted array elements at the end
-            line = re.sub(r'(\s*)([a-zA-Z0-9_]+)(\s*)(,?)(\s*)\]', r'\1"\2"\3\4\5]', line)
-            
-            fixed_lines.append(line)
-        
-        fixed_json = '\n'.join(fixed_lines)
-        
-        # One final check - if we have any keys or values without quotes, try to fix them
-        fixed_json = re.sub(r':\s*([a-zA-Z0-9_]+)([,\]}])', r': "\1"\2', fixed_json)
+        # Nothing left to fix once the surrounding text is gone
+        try:
+            _loads(fixed_json)
+            return fixed_json
+        except json.JSONDecodeError:
+            pass
         
-        return fixed_json
+        # Quote bare keys and string values in one pass. Quoted strings are matched
+        # as whole tokens, so text inside them is never touched, and numbers,
+        # true, false and null are kept as they are.
+        return _RE_JSON_TOKEN.sub(_quote_bare_word, fixed_json)
     
     def validate_json(self, json_str: str) -> tuple[Optional[Dict[str, Any]], Optional[str]]:
         """
         Validate the JSON string and return the parsed object or error message.
         
         Args:
-            json_str: JSON string to validate
+            json_str: JSON string to validate, or an already parsed object
             
         Returns:
             Tuple of (parsed_json, error_message)
             If JSON is valid, parsed_json will be the parsed object and error_message will be None
             If JSON is invalid, parsed_json will be None and error_message will contain the error details
         """
+        # Already parsed, e.g. by _extract_json
+        if isinstance(json_str, (dict, list)):
+            return json_str, None
+        
         if not json_str:
             return None, "Empty JSON string"
             
         try:
             # Try to parse the JSON
+            return _loads(json_str), None
+        except json.JSONDecodeError:
+            pass
+        
+        try:
+            # Parse again with the standard library, which accepts a few inputs
+            # orjson rejects (such as integers beyond 64 bits) and gives clearer messages
             parsed_json = json.loads(json_str)
             return parsed_json, None
         except json.JSONDecodeError as e:
@@ -596,7 +861,8 @@ class LLMJsonGenerator:
     def generate(self, template_path: str, replacements: Dict[str, str], 
                  output_folder: str, output_filename: str, output_ext: str, 
                  max_retries: int = 1, debug: bool = False, show_output: bool = True,
-                 direct_prompt_file: Optional[str] = None) -> bool:
+                 direct_prompt_file: Optional[str] = None, name_key: Optional[str] = None,
+                 prompt_text: Optional[str] = None) -> bool:
         """
         Generate a JSON file using an LLM based on the template and replacements.
         
@@ -610,22 +876,32 @@ class LLMJsonGenerator:
             debug: Whether to save debug information
             show_output: Whether to display LLM output to screen
             direct_prompt_file: Optional path to a prompt file to use directly instead of template and replacements
+            name_key: Optional JSON field whose value, sanitized, replaces output_filename when present
+            prompt_text: Optional pre-rendered prompt, used as-is instead of a prompt file or template
             
         Returns:
-            True if successful, False otherwise
+            True if successful, False otherwise. On success the written path and
+            content are available as last_output_file and last_json_bytes.
         """
+        self.last_error = None
+        self.last_exception = None
+        self.last_status_code = None
+        self.last_output_file = None
+        self.last_json_bytes = None
         try:
             # Create output directory if it doesn't exist
             os.makedirs(output_folder, exist_ok=True)
             
-            # If direct prompt file is provided, use it instead of template and replacements
-            if direct_prompt_file:
+            # A pre-rendered prompt or a direct prompt file takes precedence over the template
+            if prompt_text is not None:
+                prompt = prompt_text
+            elif direct_prompt_file:
                 try:
-                    with open(direct_prompt_file, 'r', encoding='utf-8') as f:
-                        prompt = f.read()
+                    prompt = _read_text_file(direct_prompt_file)
                     self.display.debug(f"Using direct prompt from file: {direct_prompt_file}")
                 except Exception as e:
                     self.display.error(f"Error reading direct prompt file: {e}")
+                    self.last_error = str(e)
                     return False
             else:
                 # Read template
@@ -636,8 +912,11 @@ class LLMJsonGenerator:
                 prompt = self._fill_template(template, replacements)
                 self.display.debug(f"Filled template with {len(replacements)} replacements")
             
+            # Intermediate and error files are named after the requested output name
+            base_path = os.path.join(output_folder, output_filename)
+            
             if debug:
-                prompt_file = os.path.join(output_folder, f"{output_filename}.prompt.txt")
+                prompt_file = f"{base_path}.prompt.txt"
                 with open(prompt_file, 'w', encoding='utf-8') as f:
                     f.write(prompt)
                 self.display.debug(f"Saved prompt to {prompt_file}")
@@ -650,25 +929,35 @@ class LLMJsonGenerator:
                     self.display.debug(f"Attempt {attempt + 1}/{max_retries}")
                 
                 # Query LLM
-                response = self.query_llm(prompt, show_output)
+                response = self._query_llm_with_retry(prompt, show_output)
                 
                 if debug:
-                    response_file = os.path.join(output_folder, f"{output_filename}.attempt{attempt+1}.response.txt")
+                    response_file = f"{base_path}.attempt{attempt+1}.response.txt"
                     with open(response_file, 'w', encoding='utf-8') as f:
                         f.write(response)
                     self.display.debug(f"Saved response to {response_file}")
                 
-                # Extract JSON content
-                json_content = self.extract_json_content(response)
+                # Extract JSON content; valid JSON comes back already parsed.
+                # The full response, with any thinking text, is not needed after this.
+                json_content, parsed_json = self._extract_json(response)
+                del response
+                error = None
                 
                 # Validate JSON
-                parsed_json, error = self.validate_json(json_content)
+                if parsed_json is None:
+                    parsed_json, error = self.validate_json(json_content)
                 
                 if parsed_json:
-                    # JSON is valid, save it
-                    output_file = os.path.join(output_folder, f"{output_filename}.{output_ext}")
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        json.dump(parsed_json, f, indent=2, ensure_ascii=False)
+                    # JSON is valid, save it under its final name; only the parsed value is written
+                    del json_content
+                    if name_key and isinstance(parsed_json, dict) and parsed_json.get(name_key):
+                        output_file = os.path.join(output_folder, f"{str(parsed_json[name_key]).translate(_FN_SANITIZE)}.{output_ext}")
+                    else:
+                        output_file = f"{base_path}.{output_ext}"
+                    json_bytes = _dumps_pretty(parsed_json)
+                    _atomic_write_bytes(output_file, json_bytes)
+                    self.last_output_file = output_file
+                    self.last_json_bytes = json_bytes
                     self.display.success(f"Generated valid JSON file: {output_file}")
                     return True
                 else:
@@ -681,15 +970,16 @@ class LLMJsonGenerator:
                         prompt = retry_prompt
                         
                         if debug:
-                            retry_file = os.path.join(output_folder, f"{output_filename}.retry{attempt+1}.prompt.txt")
+                            retry_file = f"{base_path}.retry{attempt+1}.prompt.txt"
                             with open(retry_file, 'w', encoding='utf-8') as f:
                                 f.write(retry_prompt)
             
             # All attempts failed
-            self.display.error(f"Failed to generate valid JSON after {max_retries} attempts")
+            self.last_error = f"Failed to generate valid JSON after {max_retries} attempts"
+            self.display.error(self.last_error)
             
             # Save the last error response
-            error_file = os.path.join(output_folder, f"{output_filename}.{output_ext}.error")
+            error_file = f"{base_path}.{output_ext}.error"
             with open(error_file, 'w', encoding='utf-8') as f:
                 f.write(json_content)
             self.display.debug(f"Saved invalid JSON to {error_file}")
@@ -698,7 +988,30 @@ class LLMJsonGenerator:
             
         except Exception as e:
             self.display.error(f"Error generating JSON: {e}")
+            self.last_error = str(e)
+            self.last_exception = e
+            response = getattr(e, 'response', None)
+            self.last_status_code = response.status_code if response is not None else None
             return False
+    
+    def generate_batch(self, jobs: List[Dict[str, Any]], max_workers: int = 8) -> List[bool]:
+        """
+        Run several generate() calls concurrently, sharing this generator's HTTP session and token statistics.
+        
+        Args:
+            jobs: Keyword arguments for generate(), one dict per output file
+            max_workers: Maximum number of concurrent LLM requests
+            
+        Returns:
+            The generate() result of each job, in the order of jobs. The last_*
+            attributes are not meaningful after a batch, since jobs overlap.
+        """
+        def run(job: Dict[str, Any]) -> bool:
+            # Only one live progress display can be shown at a time
+            return self.generate(**{**job, "show_output": False})
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, jobs))
 
 def parse_key_value_pairs(pair_str: str) -> Dict[str, str]:
     """Parse a comma-separated string of key=value pairs into a dictionary."""
@@ -721,55 +1034,88 @@ def read_csv_to_dict(csv_path):
         csv_path: Path to the CSV file
     
     Returns:
-        Dictionary with first column values as keys and the rest of the row as a dictionary
+        Dictionary with first column values as keys and the rest of the row as a dictionary.
+        It is shared between calls until the file changes, so it must not be modified.
     """
-    result = {}
     try:
-        with open(csv_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            headers = next(csv_reader)
-            
-            key_column = headers[0]
-            
-            for row in csv_reader:
-                if not row:  # Skip empty rows
-                    continue
-                    
-                key = row[0]
-                values = {}
-                for i in range(1, len(headers)):
-                    if i < len(row):
-                        values[headers[i]] = row[i]
-                    else:
-                        values[headers[i]] = ""
-                        
-                result[key] = values
-                
-        return result
+        return _read_csv_to_dict_cached(csv_path, os.stat(csv_path).st_mtime)
     except Exception as e:
         logger.error(f"Error reading CSV file {csv_path}: {e}")
         return {}
 
+@functools.lru_cache(maxsize=16)
+def _read_csv_to_dict_cached(csv_path: str, mtime: float) -> Dict[str, Dict[str, str]]:
+    """Parse a CSV for read_csv_to_dict; the mtime argument makes a changed file miss the cache."""
+    result = {}
+    with open(csv_path, 'r', encoding='utf-8') as csv_file:
+        csv_reader = csv.reader(csv_file)
+        headers = next(csv_reader)
+        value_headers = headers[1:]
+        
+        for row in csv_reader:
+            if not row:  # Skip empty rows
+                continue
+            
+            # Missing trailing cells are filled with empty strings
+            values = row[1:len(headers)]
+            values += [""] * (len(value_headers) - len(values))
+            result[row[0]] = dict(zip(value_headers, values))
+    
+    return result
+
+# utf-8-sig also reads plain UTF-8 and gbk is a superset of gb2312
+_CSV_ENCODINGS = ['utf-8-sig', 'gbk', 'cp1252', 'latin1']
+
+# Encoding that decoded a CSV file, keyed by (path, mtime, size)
+_CSV_ENCODING_CACHE: Dict[Tuple[str, float, int], str] = {}
+
+def _csv_encodings_to_try(csv_file: str, data: bytes, key: Tuple[str, float, int]) -> List[str]:
+    """Encodings to try for a CSV file, most likely first."""
+    cached = _CSV_ENCODING_CACHE.get(key)
+    if cached:
+        return [cached] + [e for e in _CSV_ENCODINGS if e != cached]
+    
+    try:
+        data.decode('utf-8-sig')
+        return list(_CSV_ENCODINGS)
+    except UnicodeDecodeError:
+        pass
+    
+    # Not UTF-8: detect which of the other candidates fits best instead of taking
+    # the first one that happens to decode
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(data, cp_isolation=_CSV_ENCODINGS[1:]).best()
+        if best is not None:
+            logger.debug(f"Detected encoding {best.encoding} for {csv_file}")
+            return [best.encoding] + [e for e in _CSV_ENCODINGS if e != best.encoding]
+    return list(_CSV_ENCODINGS)
+
 def read_csv_for_batch_processing(csv_file: str) -> List[Dict[str, str]]:
     """Read a CSV file and return as a list of dictionaries for batch processing.
     
     Supports multiple encodings including Windows-created CSV files.
     """
     result = []
-    encodings_to_try = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312', 'cp1252', 'latin1']
     
-    for encoding in encodings_to_try:
+    # Read the file once; each encoding is then tried on the bytes in memory
+    try:
+        with open(csv_file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            data = f.read()
+    except OSError as e:
+        logger.error(f"Error reading CSV file {csv_file}: {e}")
+        return result
+    
+    key = (os.path.abspath(csv_file), st.st_mtime, st.st_size)
+    for encoding in _csv_encodings_to_try(csv_file, data, key):
         try:
-            with open(csv_file, 'r', encoding=encoding) as f:
-                reader = csv.DictReader(f)
-                result = []
-                for row in reader:
-                    # Skip empty rows
-                    if any(row.values()):
-                        result.append(row)
-                
-                logger.debug(f"Successfully read CSV file {csv_file} with encoding: {encoding}")
-                return result
+            reader = csv.DictReader(io.StringIO(data.decode(encoding), newline=''))
+            # Skip empty rows
+            result = [row for row in reader if any(row.values())]
+            
+            _CSV_ENCODING_CACHE[key] = encoding
+            logger.debug(f"Successfully read CSV file {csv_file} with encoding: {encoding}")
+            return result
                 
         except (UnicodeDecodeError, UnicodeError):
             logger.debug(f"Failed to read {csv_file} with encoding: {encoding}")
@@ -781,17 +1127,32 @@ def read_csv_for_batch_processing(csv_file: str) -> List[Dict[str, str]]:
     logger.error(f"Failed to read CSV file {csv_file} with any supported encoding")
     return result
 
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_BATCH_RESULT_FIELDS = ['test_index', 'test_name', 'csv_data', 'json_status',
+                        'onnx_status', 'output_directory', 'timestamp', 'error_message', 'generation_count']
+
+# Results of the current run keyed by results CSV path, so that saving a result
+# appends one row instead of re-reading and rewriting the whole file
+_batch_results_state: Dict[str, Dict[int, Dict[str, str]]] = {}
+# Append handle and CSV writer per results CSV path, kept open until finalized
+_batch_results_writers: Dict[str, Tuple[Any, csv.DictWriter]] = {}
+_batch_results_lock = threading.Lock()
+
 def load_batch_results(results_csv_path: str) -> Dict[int, Dict[str, str]]:
-    """Load existing batch results from CSV file."""
+    """Load existing batch results from CSV file; for repeated test indexes the last row wins."""
     results = {}
     if os.path.exists(results_csv_path):
         try:
-            with open(results_csv_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if 'test_index' in row and row['test_index']:
-                        test_index = int(row['test_index'])
-                        results[test_index] = row
+            with open(results_csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+                reader = csv.reader(f)
+                headers = next(reader, None)
+                if headers and 'test_index' in headers:
+                    index_col = headers.index('test_index')
+                    for row in reader:
+                        # Only rows with a test index are turned into dicts
+                        if index_col < len(row) and row[index_col]:
+                            results[int(row[index_col])] = dict(zip(headers, row))
         except Exception as e:
             logger.error(f"Error loading batch results from {results_csv_path}: {e}")
     return results
@@ -799,47 +1160,82 @@ def load_batch_results(results_csv_path: str) -> Dict[int, Dict[str, str]]:
 def save_batch_result(results_csv_path: str, test_index: int, test_name: str, 
                      csv_data: Dict[str, str], json_status: str, onnx_status: str,
                      output_directory: str, error_message: str = "", generation_count: int = 1):
-    """Save a single batch result to CSV file."""
-    import datetime
-    
-    # Check if file exists to determine if we need headers
-    file_exists = os.path.exists(results_csv_path)
-    
-    # Load existing results
-    existing_results = load_batch_results(results_csv_path) if file_exists else {}
-    
-    # Update the result, incrementing generation count if retrying
-    if test_index in existing_results:
-        # This is a retry, increment the generation count
-        existing_generation_count = int(existing_results[test_index].get('generation_count', 1))
-        generation_count = existing_generation_count + 1
-    
-    existing_results[test_index] = {
-        'test_index': str(test_index),
-        'test_name': test_name,
-        'csv_data': json.dumps(csv_data, ensure_ascii=False),
-        'json_status': json_status,
-        'onnx_status': onnx_status,
-        'output_directory': output_directory,
-        'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'error_message': error_message,
-        'generation_count': str(generation_count)
-    }
-    
-    # Write all results back to file with UTF-8 BOM for Windows compatibility
-    try:
-        with open(results_csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-            fieldnames = ['test_index', 'test_name', 'csv_data', 'json_status', 
-                         'onnx_status', 'output_directory', 'timestamp', 'error_message', 'generation_count']
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            # Write results sorted by test_index
-            for idx in sorted(existing_results.keys()):
-                writer.writerow(existing_results[idx])
+    """Append a single batch result to the CSV file; finalize_batch_results compacts it."""
+    with _batch_results_lock:
+        existing_results = _batch_results_state.get(results_csv_path)
+        if existing_results is None:
+            existing_results = _batch_results_state[results_csv_path] = load_batch_results(results_csv_path)
+        
+        # Update the result, incrementing generation count if retrying
+        if test_index in existing_results:
+            # This is a retry, increment the generation count
+            existing_generation_count = int(existing_results[test_index].get('generation_count', 1))
+            generation_count = existing_generation_count + 1
+        
+        result = {
+            'test_index': str(test_index),
+            'test_name': test_name,
+            'csv_data': _dumps(csv_data).decode('utf-8'),
+            'json_status': json_status,
+            'onnx_status': onnx_status,
+            'output_directory': output_directory,
+            'timestamp': datetime.datetime.now().strftime(_TIMESTAMP_FORMAT),
+            'error_message': error_message,
+            'generation_count': str(generation_count)
+        }
+        existing_results[test_index] = result
+        
+        # Append the row through a handle kept open for the run; the header and
+        # the UTF-8 BOM (for Windows compatibility) are only written when the file is new
+        try:
+            f, writer = _batch_results_writers.get(results_csv_path, (None, None))
+            if f is None:
+                f = open(results_csv_path, 'a', encoding='utf-8-sig', newline='')
+                writer = csv.DictWriter(f, fieldnames=_BATCH_RESULT_FIELDS)
+                if f.tell() == 0:
+                    writer.writeheader()
+                _batch_results_writers[results_csv_path] = (f, writer)
+            writer.writerow(result)
+            # Flush every row so an interrupted run can still resume from it
+            f.flush()
                 
-    except Exception as e:
-        logger.error(f"Error saving batch result to {results_csv_path}: {e}")
+        except Exception as e:
+            logger.error(f"Error saving batch result to {results_csv_path}: {e}")
+
+# finalize_batch_results walks the index range only while it is at most this
+# many times the number of results
+_DENSE_INDEX_FACTOR = 4
+
+def finalize_batch_results(results_csv_path: str):
+    """Rewrite the results CSV with one row per test, sorted by test_index."""
+    with _batch_results_lock:
+        f, _ = _batch_results_writers.pop(results_csv_path, (None, None))
+        if f is not None:
+            f.close()
+        results = _batch_results_state.pop(results_csv_path, None)
+        if results is None:
+            return
+        
+        buffer = io.StringIO(newline='')
+        writer = csv.DictWriter(buffer, fieldnames=_BATCH_RESULT_FIELDS)
+        writer.writeheader()
+        # Test indexes are CSV row numbers, usually close to contiguous, so walking
+        # their range yields the rows in order without sorting the keys. A stale or
+        # hand-edited index in an existing results file can leave a large gap,
+        # in which case sorting is cheaper than walking it.
+        if results:
+            low, high = min(results), max(results)
+            if high - low < _DENSE_INDEX_FACTOR * len(results):
+                indexes = (idx for idx in range(low, high + 1) if idx in results)
+            else:
+                indexes = sorted(results)
+            for idx in indexes:
+                writer.writerow(results[idx])
+        
+        try:
+            _atomic_write_bytes(results_csv_path, buffer.getvalue().encode('utf-8-sig'))
+        except Exception as e:
+            logger.error(f"Error saving batch results to {results_csv_path}: {e}")
 
 def find_operator_params(operator_name, csv_path):
     """
@@ -854,46 +1250,86 @@ def find_operator_params(operator_name, csv_path):
         String containing operator parameters or None if not found
     """
     try:
-        with open(csv_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            
-            # Read headers
-            headers = next(csv_reader)
-            
-            # Find name column index (it should be 'operator_name')
-            name_idx = -1
-            for i, header in enumerate(headers):
-                if header.lower() == 'operator_name':
-                    name_idx = i
-                    break
-            
-            if name_idx == -1:
-                logger.error(f"Could not find operator_name column in CSV: {headers}")
-                return None
-            
-            # Convert operator_name to lower case for case-insensitive matching
-            op_name_lower = operator_name.lower()
-            
-            # Search for the operator
-            for row in csv_reader:
-                if len(row) > name_idx and row[name_idx].strip().lower() == op_name_lower:
-                    # Found the operator, now extract all parameters
-                    params = {}
-                    for i, header in enumerate(headers):
-                        if i < len(row) and row[i]:
-                            params[header] = row[i]
-                    
-                    # Format the parameters as a string
-                    formatted_params = format_operator_params(params, headers)
-                    logger.debug(f"Found parameters for {operator_name}: {formatted_params[:100]}...")
-                    return formatted_params
-            
-            logger.debug(f"Operator '{operator_name}' not found in CSV file")
-            return None
-    
+        operators = _load_operator_params(csv_path, os.stat(csv_path).st_mtime)
     except Exception as e:
         logger.error(f"Error reading CSV file: {e}")
         return None
+    
+    # Case-insensitive matching: the table is keyed by the lower-case name
+    formatted_params = operators.get(operator_name.lower())
+    if formatted_params is None:
+        logger.debug(f"Operator '{operator_name}' not found in CSV file")
+        return None
+    
+    logger.debug(f"Found parameters for {operator_name}: {formatted_params[:100]}...")
+    return formatted_params
+
+@functools.lru_cache(maxsize=8)
+def _load_operator_params(csv_path: str, mtime: float) -> Dict[str, str]:
+    """
+    Parse the operator CSV into formatted parameter strings keyed by lower-case operator name.
+    
+    The mtime is part of the cache key, so an edited CSV is parsed again.
+    """
+    with open(csv_path, 'r', encoding='utf-8') as csv_file:
+        csv_reader = csv.reader(csv_file)
+        
+        # Read headers
+        headers = next(csv_reader)
+        
+        # Find name column index (it should be 'operator_name')
+        name_idx = -1
+        for i, header in enumerate(headers):
+            if header.lower() == 'operator_name':
+                name_idx = i
+                break
+        
+        if name_idx == -1:
+            raise ValueError(f"Could not find operator_name column in CSV: {headers}")
+        
+        operators = {}
+        for row in csv_reader:
+            if len(row) <= name_idx:
+                continue
+            op_name_lower = row[name_idx].strip().lower()
+            # The first row for an operator wins, as with the former linear search
+            if op_name_lower in operators:
+                continue
+            
+            params = {}
+            for i, header in enumerate(headers):
+                if i < len(row) and row[i]:
+                    params[header] = row[i]
+            operators[op_name_lower] = format_operator_params(params, headers)
+    
+    return operators
+
+def _format_param_section(formatted, title, params, prefix, skip_empty_names=False):
+    """
+    Append one section of "name (类型: type) - description" lines to formatted.
+    
+    Names and types in the {prefix}_name/{prefix}_type columns are separated by
+    commas, descriptions in {prefix}_description by semicolons.
+    """
+    names = params[f'{prefix}_name'].split(',')
+    types = params.get(f'{prefix}_type', '').split(',')
+    descriptions = params.get(f'{prefix}_description', '').split(';')
+    
+    items = []
+    for name, type_, description in itertools.islice(
+            itertools.zip_longest(names, types, descriptions, fillvalue=''), len(names)):
+        name = name.strip()
+        if skip_empty_names and not name:
+            continue
+        type_ = type_.strip()
+        description = description.strip()
+        items.append(f"  - {name}"
+                     + (f" (类型: {type_})" if type_ else "")
+                     + (f" - {description}" if description else ""))
+    
+    if items:
+        formatted.append(title)
+        formatted.extend(items)
 
 def format_operator_params(params, headers):
     """
@@ -917,73 +1353,16 @@ def format_operator_params(params, headers):
         formatted.append(f"支持版本: {params['versions']}")
     
     # Format inputs
-    inputs = []
     if 'input_name' in params:
-        input_names = params['input_name'].split(',')
-        input_types = params.get('input_type', '').split(',')
-        input_descriptions = params.get('input_description', '').split(';')
-        
-        for i in range(len(input_names)):
-            input_info = f"{input_names[i].strip()}"
-            
-            if i < len(input_types) and input_types[i].strip():
-                input_info += f" (类型: {input_types[i].strip()})"
-            
-            if i < len(input_descriptions) and input_descriptions[i].strip():
-                input_info += f" - {input_descriptions[i].strip()}"
-            
-            inputs.append(input_info)
-        
-        if inputs:
-            formatted.append("输入:")
-            formatted.extend([f"  - {input_item}" for input_item in inputs])
+        _format_param_section(formatted, "输入:", params, 'input')
     
     # Format outputs
-    outputs = []
     if 'output_name' in params:
-        output_names = params['output_name'].split(',')
-        output_types = params.get('output_type', '').split(',')
-        output_descriptions = params.get('output_description', '').split(';')
-        
-        for i in range(len(output_names)):
-            output_info = f"{output_names[i].strip()}"
-            
-            if i < len(output_types) and output_types[i].strip():
-                output_info += f" (类型: {output_types[i].strip()})"
-            
-            if i < len(output_descriptions) and output_descriptions[i].strip():
-                output_info += f" - {output_descriptions[i].strip()}"
-            
-            outputs.append(output_info)
-        
-        if outputs:
-            formatted.append("输出:")
-            formatted.extend([f"  - {output_item}" for output_item in outputs])
+        _format_param_section(formatted, "输出:", params, 'output')
     
     # Format attributes
-    attributes = []
     if 'attribute_name' in params and params['attribute_name']:
-        attr_names = params['attribute_name'].split(',')
-        attr_types = params.get('attribute_type', '').split(',')
-        attr_descriptions = params.get('attribute_description', '').split(';')
-        
-        for i in range(len(attr_names)):
-            if not attr_names[i].strip():
-                continue
-                
-            attr_info = f"{attr_names[i].strip()}"
-            
-            if i < len(attr_types) and attr_types[i].strip():
-                attr_info += f" (类型: {attr_types[i].strip()})"
-            
-            if i < len(attr_descriptions) and attr_descriptions[i].strip():
-                attr_info += f" - {attr_descriptions[i].strip()}"
-            
-            attributes.append(attr_info)
-        
-        if attributes:
-            formatted.append("属性:")
-            formatted.extend([f"  - {attr_item}" for attr_item in attributes])
+        _format_param_section(formatted, "属性:", params, 'attribute', skip_empty_names=True)
     
     # Add execution unit if available
     if 'npu_unit' in params and params['npu_unit']:
@@ -991,6 +1370,27 @@ def format_operator_params(params, headers):
     
     return "\n".join(formatted)
 
+def _operator_type(operator_params: str) -> str:
+    """
+    Classify a single operator from its formatted parameters by counting the
+    "  - " items under its 输入: and 输出: sections in one pass.
+    """
+    counts = {"输入:": 0, "输出:": 0}
+    section = None
+    for line in operator_params.split('\n'):
+        if line.startswith("  - "):
+            if section is not None:
+                counts[section] += 1
+        else:
+            # Any other header (属性:, 执行单元: ...) ends the current section
+            section = line.strip() if line.strip() in counts else None
+    
+    if counts["输入:"] == 2 and counts["输出:"] == 1:
+        return "binary arithmetic"
+    if counts["输入:"] == 1 and counts["输出:"] == 1:
+        return "unary"
+    return "others"
+
 def format_test_point_info(test_point_data):
     """
     Format test point information into a structured string.
@@ -1031,8 +1431,7 @@ def format_test_point_info(test_point_data):
 def read_file_content(file_path):
     """Read content from a file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return _read_text_file(file_path)
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {e}")
         return ""
@@ -1048,6 +1447,67 @@ def create_temp_file(content, prefix="tmp_", suffix=".txt"):
         logger.error(f"Error creating temporary file: {e}")
         return None
 
+# Resource subdirectories that are also subpackages
+_RESOURCE_PACKAGES = {
+    'prompts': 'ai_json_generator.prompts',
+    'data_files': 'ai_json_generator.data_files',
+}
+_PACKAGE_PATH = os.path.abspath(os.path.dirname(__file__))
+
+@functools.lru_cache(maxsize=None)
+def _resource_dir(subdir: str):
+    """The importlib.resources Traversable of a resource subpackage, or None."""
+    package = _RESOURCE_PACKAGES.get(subdir)
+    if not package:
+        return None
+    try:
+        return importlib.resources.files(package)
+    except (ImportError, TypeError) as e:
+        logger.warning(f"Error trying to find {subdir} module: {e}")
+        return None
+
+@functools.lru_cache(maxsize=None)
+def _site_packages_dirs() -> Tuple[str, ...]:
+    """site-packages directories to search, including the active virtualenv's."""
+    site_packages_dirs = list(site.getsitepackages())
+    
+    if 'VIRTUAL_ENV' in os.environ:
+        venv_path = os.environ['VIRTUAL_ENV']
+        site_packages_dirs.extend([
+            os.path.join(venv_path, 'lib', f'python{sys.version_info.major}.{sys.version_info.minor}', 'site-packages'),
+            os.path.join(venv_path, 'lib64', f'python{sys.version_info.major}.{sys.version_info.minor}', 'site-packages')
+        ])
+    return tuple(site_packages_dirs)
+
+def _listing_exists_checker():
+    """
+    Return an exists(path) function that lists each parent directory once
+    (one os.scandir) and answers later probes in it from that listing.
+    
+    It is not a general replacement for os.path.exists: names are compared
+    case-sensitively even on case-insensitive filesystems, and a listing is
+    never refreshed, so files created after it was taken are not seen. Only
+    use it for a short burst of probes, like the candidate paths of one
+    find_resource_path call, and create a new checker for each burst.
+    Broken symlinks are left out of the listing, as os.path.exists does.
+    """
+    listings: Dict[str, frozenset] = {}
+    
+    def exists(path: str) -> bool:
+        parent, name = os.path.split(path)
+        names = listings.get(parent)
+        if names is None:
+            try:
+                with os.scandir(parent or '.') as entries:
+                    names = frozenset(entry.name for entry in entries
+                                      if not entry.is_symlink() or os.path.exists(entry.path))
+            except OSError:
+                names = frozenset()
+            listings[parent] = names
+        return name in names
+    
+    return exists
+
 def find_resource_path(relative_path):
     """
     Find the path to a resource file within the package.
@@ -1059,89 +1519,21 @@ def find_resource_path(relative_path):
         Absolute path to the resource file, or None if not found
     """
     try:
-        # Get the package directory
-        import os
-        
-        # Try to determine which part is the package name and which is the relative path
-        parts = relative_path.split('/')
-        
-        # For standard locations, try direct imports first
-        if relative_path.startswith('prompts/'):
-            try:
-                # Try to treat 'prompts' as a subpackage
-                file_name = os.path.basename(relative_path)
-                try:
-                    # Try to import the prompts module directly
-                    prompts_module = import_module('ai_json_generator.prompts')
-                    spec_path = os.path.join(os.path.dirname(prompts_module.__file__), file_name)
-                    if os.path.exists(spec_path):
-                        logger.debug(f"Found resource through module import: {spec_path}")
-                        return spec_path
-                except (ImportError, ModuleNotFoundError):
-                    pass
-                
-                # Try to get it as a resource using importlib.resources
-                try:
-                    with importlib.resources.path('ai_json_generator.prompts', file_name) as p:
-                        resource_path = str(p)
-                        if os.path.exists(resource_path):
-                            logger.debug(f"Found resource through importlib.resources: {resource_path}")
-                            return resource_path
-                except (ImportError, ModuleNotFoundError, FileNotFoundError):
-                    pass
-                    
-                # Try to get it using pkg_resources
-                try:
-                    import pkg_resources as old_pkg_resources
-                    resource_path = old_pkg_resources.resource_filename('ai_json_generator.prompts', file_name)
-                    if os.path.exists(resource_path):
-                        logger.debug(f"Found resource through pkg_resources: {resource_path}")
-                        return resource_path
-                except (ImportError, Exception):
-                    pass
-                    
-            except Exception as e:
-                logger.warning(f"Error trying to find prompts module: {e}")
-                
-        elif relative_path.startswith('data_files/'):
-            try:
-                # Try to treat 'data_files' as a subpackage
-                file_name = os.path.basename(relative_path)
-                try:
-                    # Try to import the data_files module directly
-                    data_files_module = import_module('ai_json_generator.data_files')
-                    spec_path = os.path.join(os.path.dirname(data_files_module.__file__), file_name)
-                    if os.path.exists(spec_path):
-                        logger.debug(f"Found resource through module import: {spec_path}")
-                        return spec_path
-                except (ImportError, ModuleNotFoundError):
-                    pass
-                
-                # Try to get it as a resource using importlib.resources
-                try:
-                    with importlib.resources.path('ai_json_generator.data_files', file_name) as p:
-                        resource_path = str(p)
-                        if os.path.exists(resource_path):
-                            logger.debug(f"Found resource through importlib.resources: {resource_path}")
-                            return resource_path
-                except (ImportError, ModuleNotFoundError, FileNotFoundError):
-                    pass
-                    
-                # Try to get it using pkg_resources
-                try:
-                    import pkg_resources as old_pkg_resources
-                    resource_path = old_pkg_resources.resource_filename('ai_json_generator.data_files', file_name)
-                    if os.path.exists(resource_path):
-                        logger.debug(f"Found resource through pkg_resources: {resource_path}")
-                        return resource_path
-                except (ImportError, Exception):
-                    pass
-                    
-            except Exception as e:
-                logger.warning(f"Error trying to find data_files module: {e}")
-        
-        # Fall back to looking for absolute paths within the package
-        package_path = os.path.abspath(os.path.dirname(__file__))
+        # For standard locations, look in the matching subpackage first
+        subdir, _, file_name = relative_path.partition('/')
+        resource_dir = _resource_dir(subdir) if file_name else None
+        if resource_dir is not None:
+            resource = resource_dir / file_name
+            if resource.is_file():
+                resource_path = str(resource)
+                logger.debug(f"Found resource through importlib.resources: {resource_path}")
+                return resource_path
+        
+        # Fall back to looking for absolute paths within the package. Many of the
+        # candidates share a directory, so each directory is listed only once;
+        # the checker is created here so its listings are fresh for this lookup.
+        exists = _listing_exists_checker()
+        package_path = _PACKAGE_PATH
         
         # Form all possible paths
         search_paths = [
@@ -1156,7 +1548,7 @@ def find_resource_path(relative_path):
         
         # Check all paths
         for path in search_paths:
-            if os.path.exists(path):
+            if exists(path):
                 logger.debug(f"Found resource at: {path}")
                 return path
         
@@ -1171,20 +1563,12 @@ def find_resource_path(relative_path):
         ]
         
         for path in parent_paths:
-            if os.path.exists(path):
+            if exists(path):
                 logger.debug(f"Found resource in parent directory: {path}")
                 return path
         
         # If still not found, let's look at some typical installation paths
-        # Get list of all site-packages directories
-        site_packages_dirs = site.getsitepackages()
-        
-        if 'VIRTUAL_ENV' in os.environ:
-            venv_path = os.environ['VIRTUAL_ENV']
-            site_packages_dirs.extend([
-                os.path.join(venv_path, 'lib', f'python{sys.version_info.major}.{sys.version_info.minor}', 'site-packages'),
-                os.path.join(venv_path, 'lib64', f'python{sys.version_info.major}.{sys.version_info.minor}', 'site-packages')
-            ])
+        site_packages_dirs = list(_site_packages_dirs())
         
         for site_dir in site_packages_dirs:
             site_paths = [
@@ -1192,7 +1576,7 @@ def find_resource_path(relative_path):
             ]
             
             for path in site_paths:
-                if os.path.exists(path):
+                if exists(path):
                     logger.debug(f"Found resource in site-packages: {path}")
                     return path
         
@@ -1205,7 +1589,7 @@ def find_resource_path(relative_path):
         ]
         
         for path in dev_paths:
-            if os.path.exists(path):
+            if exists(path):
                 logger.debug(f"Found resource in development directory: {path}")
                 return path
         
@@ -1219,7 +1603,7 @@ def find_resource_path(relative_path):
                 ]
                 
                 for path in special_paths:
-                    if os.path.exists(path):
+                    if exists(path):
                         logger.info(f"Found op_testcase.prompt at: {path}")
                         return path
         
@@ -1230,6 +1614,136 @@ def find_resource_path(relative_path):
         logger.error(f"Error finding resource {relative_path}: {str(e)}")
         return None
 
+# Resolved resource paths keyed by relative path, together with the mtime of
+# the directory they were found in. find_resource_path probes many locations,
+# so a hit costs a single stat instead.
+_PATH_CACHE: Dict[str, Tuple[float, str]] = {}
+
+def _resolve(relative_path: str) -> Optional[str]:
+    """find_resource_path, cached until the resource's directory changes."""
+    cached = _PATH_CACHE.get(relative_path)
+    if cached:
+        mtime, path = cached
+        try:
+            if os.stat(os.path.dirname(path) or '.').st_mtime == mtime:
+                return path
+        except OSError:
+            pass
+    path = find_resource_path(relative_path)
+    if path:
+        try:
+            _PATH_CACHE[relative_path] = (os.stat(os.path.dirname(path) or '.').st_mtime, path)
+        except OSError:
+            pass
+    return path
+
+def _load_template(template_path: str) -> str:
+    """Read a prompt template file, caching its content until the file changes."""
+    return _read_text_file(template_path)
+
+# Matches single-brace placeholders such as {算子名}
+_PLACEHOLDER_RE = re.compile(r'\{([^{}\s]+)\}')
+
+def _fill_placeholders(template: str, replacements: Dict[str, str]) -> str:
+    """Replace ``{key}`` placeholders in one pass over the template; unknown keys are kept."""
+    if not replacements:
+        return template
+    return _PLACEHOLDER_RE.sub(lambda m: replacements.get(m.group(1), m.group(0)), template)
+
+def _is_retryable_request_error(error: Optional[Exception]) -> bool:
+    """Check whether a failed LLM request may succeed when sent again."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+def _sleep_backoff(attempt: int, base: float = 0.5, cap: float = 30) -> None:
+    """Sleep with exponential backoff and jitter before retry ``attempt``."""
+    time.sleep(min(cap, base * 2 ** attempt) * (0.5 + random.random()))
+
+def _tail(path: str, max_bytes: int = 8192) -> str:
+    """Read at most the last max_bytes of a text file, starting at a line boundary."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > max_bytes:
+            f.seek(size - max_bytes)
+            data = f.read()
+            # Drop the partial first line
+            newline = data.find(b'\n')
+            if newline != -1:
+                data = data[newline + 1:]
+        else:
+            data = f.read()
+    return data.decode('utf-8', errors='replace')
+
+# Background worker for renaming the files of a failed attempt
+_IO_EXEC = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ai_json_generator_io')
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
+    """Write bytes through a temporary file and rename it over path, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+def _safe_rename(src_path: str, dest_path: str) -> None:
+    """Rename src_path over dest_path, skipping sources that do not exist."""
+    try:
+        # os.replace also overwrites an existing destination on Windows
+        os.replace(src_path, dest_path)
+    except FileNotFoundError:
+        pass
+
+def _move_dir(src_path: str, dest_path: str) -> None:
+    """
+    Move a directory to dest_path, replacing any existing directory there.
+    
+    On the same filesystem the move is a rename. An existing destination is
+    first renamed into a uniquely named directory beside it, so dest_path is
+    briefly absent between the two renames, and deleted in a background thread.
+    """
+    dest_parent, dest_name = os.path.split(os.path.abspath(dest_path))
+    # A unique aside directory per move, so concurrent or back-to-back moves to
+    # the same destination never share it with a pending background delete
+    old_root = tempfile.mkdtemp(prefix=f".{dest_name}.old.", dir=dest_parent)
+    old_path = os.path.join(old_root, dest_name)
+    try:
+        os.replace(dest_path, old_path)
+        logger.warning(f"Replacing existing directory at destination: {dest_path}")
+    except FileNotFoundError:
+        os.rmdir(old_root)
+        old_root = None
+    
+    try:
+        try:
+            os.replace(src_path, dest_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Source and destination are on different filesystems
+            shutil.copytree(src_path, dest_path, dirs_exist_ok=True)
+            shutil.rmtree(src_path)
+    except Exception:
+        # Put the previous destination back so a failed move loses nothing
+        if old_root and not os.path.exists(dest_path):
+            os.replace(old_path, dest_path)
+            os.rmdir(old_root)
+        elif old_root:
+            shutil.rmtree(old_root, ignore_errors=True)
+        raise
+    
+    if old_root:
+        threading.Thread(target=shutil.rmtree, args=(old_root,), kwargs={'ignore_errors': True}).start()
+
+# The "输出目录: <path>" line printed by irjson-convert, with an ASCII or full-width colon
+_OUTDIR_RE = re.compile(r'输出目录[:：]\s*(.+)')
+
 def run_irjson_convert(json_file: str, output_dir: str) -> Tuple[bool, Optional[str]]:
     """
     Run irjson-convert command to convert JSON to ONNX model.
@@ -1249,8 +1763,8 @@ def run_irjson_convert(json_file: str, output_dir: str) -> Tuple[bool, Optional[
         # Create log file path in the same directory as the JSON file
         log_file = os.path.join(os.path.dirname(json_file), 'irjson_convert.log')
         
-        # Prepare the command
-        cmd = f"irjson-convert {json_file} -o {output_dir}"
+        # Prepare the command; run directly rather than through a shell, so paths need no quoting
+        cmd = ["irjson-convert", json_file, "-o", output_dir]
         
         # To store the actual output directory from the command's stdout
         actual_model_dir = None
@@ -1258,31 +1772,29 @@ def run_irjson_convert(json_file: str, output_dir: str) -> Tuple[bool, Optional[
         # Run the command and capture output
         process = subprocess.Popen(
             cmd,
-            shell=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            encoding='utf-8'
+            bufsize=1 << 16,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
         )
         
-        # Open log file for writing
-        with open(log_file, 'w', encoding='utf-8') as f:
+        # Open log file for writing. It is only read once the process has exited,
+        # so it is block buffered rather than flushed after every line.
+        with open(log_file, 'w', encoding='utf-8', buffering=1 << 16) as f:
             # Process and handle output in real-time
             for output in process.stdout:
                 # Write to log file
                 f.write(output)
-                f.flush()
                 # Print to screen
                 console.print(output.strip())
-                sys.stdout.flush()
                 
                 # Look for the output directory line
-                if "输出目录:" in output:
-                    # Extract the path, which is the part after the colon
-                    path_match = output.split("输出目录:", 1)
-                    if len(path_match) > 1:
-                        actual_model_dir = path_match[1].strip()
-                        logger.debug(f"Detected model output directory: {actual_model_dir}")
+                path_match = _OUTDIR_RE.search(output)
+                if path_match:
+                    actual_model_dir = path_match.group(1).strip()
+                    logger.debug(f"Detected model output directory: {actual_model_dir}")
 
         # Wait for the process to complete and get the return code
         return_code = process.wait()
@@ -1296,6 +1808,9 @@ def run_irjson_convert(json_file: str, output_dir: str) -> Tuple[bool, Optional[
             logger.debug(f"Check {log_file} for details")
             return False, None
             
+    except FileNotFoundError:
+        logger.error("irjson-convert command not found, make sure it is installed and on PATH")
+        return False, None
     except Exception as e:
         logger.error(f"Error running irjson-convert: {str(e)}")
         return False, None
@@ -1304,8 +1819,12 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
                      test_point: Optional[str] = None, graph_pattern: Optional[str] = None,
                      add_req: Optional[str] = None, direct_prompt: Optional[str] = None,
                      direct_request: Optional[str] = None,
-                     convert_to_onnx: bool = False, max_retries: int = 1, debug: bool = False) -> bool:
-    """Generate test case for the specified operator(s)."""
+                     convert_to_onnx: bool = False, max_retries: int = 1, debug: bool = False,
+                     global_generator: Optional['LLMJsonGenerator'] = None) -> bool:
+    """Generate test case for the specified operator(s).
+    
+    Token usage is also added to global_generator's statistics when given.
+    """
     # Ensure the base output directory exists first.
     os.makedirs(output_dir, exist_ok=True)
 
@@ -1314,8 +1833,10 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
         # Use a fixed-name directory for processing.
         process_dir = os.path.join(output_dir, "llm_process")
         # Clean up previous failed runs if it exists
-        if os.path.exists(process_dir):
+        try:
             shutil.rmtree(process_dir)
+        except FileNotFoundError:
+            pass
         os.makedirs(process_dir)
         current_output_dir = process_dir
         logger.debug(f"Using process directory for intermediate files: {process_dir}")
@@ -1332,6 +1853,7 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
         # Initialize generator
         display = get_display()
         generator = LLMJsonGenerator(display=display)
+        generator.token_usage_sink = global_generator
         
         def cleanup_and_return(result: bool) -> bool:
             """Helper function to print token summary before returning."""
@@ -1342,6 +1864,7 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
         current_retry = 0
         last_json_file = None
         last_prompt = None
+        prompt_text = None
         last_json_content = None
         last_error_content = None
         
@@ -1358,229 +1881,176 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
         else:
             base_output_name = "custom_testcase"
 
-        while current_retry <= max_retries:
-            attempt_prefix = f"attempt_{current_retry}_"
-            
-            # If using direct prompt, we can skip all the template processing
-            if direct_prompt:
-                display.debug(f"Using direct prompt file: {direct_prompt}")
-                
-                # Save the original prompt content for potential retry
-                if current_retry == 0:
-                    with open(direct_prompt, 'r', encoding='utf-8') as f:
-                        last_prompt = f.read()
-                    # Save initial prompt
-                    with open(os.path.join(current_output_dir, f"initial_prompt.txt"), 'w', encoding='utf-8') as f:
-                        f.write(last_prompt)
-
-                # If this is a retry attempt, use the retry template
-                if current_retry > 0 and last_json_content and last_error_content:
-                    # Create retry prompt using retry_testcase.prompt
-                    retry_template = find_resource_path(os.path.join('prompts', 'retry_testcase.prompt'))
-                    if not retry_template:
-                        logger.error("Could not find retry_testcase.prompt template")
-                        return False
-                    
-                    with open(retry_template, 'r', encoding='utf-8') as f:
-                        retry_prompt_content = f.read()
-                    
-                    # Fill in the retry template
-                    retry_prompt_content = retry_prompt_content.replace("{prompt内容}", last_prompt if last_prompt else "")
-                    retry_prompt_content = retry_prompt_content.replace("{IR_JSON内容}", last_json_content)
-                    retry_prompt_content = retry_prompt_content.replace("{报错内容}", last_error_content)
-                    
-                    # Save the retry prompt to a temporary file
-                    temp_prompt_file = os.path.join(current_output_dir, f"retry_prompt.txt")
-                    with open(temp_prompt_file, 'w', encoding='utf-8') as f:
-                        f.write(retry_prompt_content)
-                    
-                    direct_prompt = temp_prompt_file
-                
-                success = generator.generate(
-                    "",  # Empty template path since we're using direct prompt
-                    {},
-                    current_output_dir,
-                    base_output_name,
-                    "json",
-                    max_retries=3,
-                    debug=debug,
-                    show_output=not quiet,
-                    direct_prompt_file=direct_prompt
-                )
-            else:
-                # Define paths to data files
-                data_dir = 'data_files'
-                operators_csv = find_resource_path(os.path.join(data_dir, 'onnx_operators.csv'))
-                test_point_path = find_resource_path(os.path.join(data_dir, 'test_point.txt'))
-                ir_json_format_path = find_resource_path(os.path.join(data_dir, 'IR_JSON_FORMAT.md'))
-                test_points_csv = find_resource_path(os.path.join(data_dir, 'test_points.csv'))
-                graph_patterns_csv = find_resource_path(os.path.join(data_dir, 'graph_patterns.csv'))
+        # Build the initial prompt once; retries derive their prompt from it
+        if direct_prompt:
+            display.debug(f"Using direct prompt file: {direct_prompt}")
+            last_prompt = _read_text_file(direct_prompt)
+        else:
+            # Find template
+            template_path = _resolve(os.path.join('prompts', 'op_testcase.prompt'))
+            if not template_path:
+                logger.error("Could not find op_testcase.prompt template")
+                return False
+            logger.info(f"Using template: {template_path}")
+            
+            # Define paths to data files
+            data_dir = 'data_files'
+            operators_csv = _resolve(os.path.join(data_dir, 'onnx_operators.csv'))
+            test_point_path = _resolve(os.path.join(data_dir, 'test_point.txt'))
+            ir_json_format_path = _resolve(os.path.join(data_dir, 'IR_JSON_FORMAT.md'))
+            test_points_csv = _resolve(os.path.join(data_dir, 'test_points.csv'))
+            graph_patterns_csv = _resolve(os.path.join(data_dir, 'graph_patterns.csv'))
+            
+            # Initialize variables
+            operator_params = ""
+            op_type = "others"
+            
+            # Only check operators CSV if we have an operator string and not using direct_request only
+            if operator_string and not (direct_request and not operator_string):
+                if not operators_csv:
+                    display.error("Could not find operators CSV file")
+                    return False
                 
-                # Initialize variables
-                operator_params = ""
-                op_type = "others"
+                operators_list = operator_string.split()
                 
-                # Only check operators CSV if we have an operator string and not using direct_request only
-                if operator_string and not (direct_request and not operator_string):
-                    if not operators_csv:
-                        display.error("Could not find operators CSV file")
+                # Process each operator to get their parameters
+                all_operator_params = []
+                for op in operators_list:
+                    op_params = find_operator_params(op, operators_csv)
+                    if not op_params:
+                        display.error(f"Could not find parameters for operator: {op}")
                         return False
-                    
-                    operators_list = operator_string.split()
-                    
-                    # Process each operator to get their parameters
-                    all_operator_params = []
-                    for op in operators_list:
-                        op_params = find_operator_params(op, operators_csv)
-                        if not op_params:
-                            display.error(f"Could not find parameters for operator: {op}")
-                            return False
-                        all_operator_params.append(op_params)
-                    
-                    # Combine all operator parameters for multi-operator cases
-                    if len(operators_list) > 1:
-                        combined_params = "\n\n".join([f"算子: {op}\n{params}" for op, params in zip(operators_list, all_operator_params)])
-                        operator_params = combined_params
-                        op_type = "composite"
-                    else:
-                        operator_params = all_operator_params[0]
-                        # Determine operator type for single operator
-                        if "输入:" in operator_params and "输出:" in operator_params:
-                            input_lines = [line for line in operator_params.split('\n') if line.strip().startswith("  - ") and "输入:" in operator_params.split('\n')[operator_params.split('\n').index(line)-1]]
-                            output_lines = [line for line in operator_params.split('\n') if line.strip().startswith("  - ") and "输出:" in operator_params.split('\n')[operator_params.split('\n').index(line)-1]]
-                            
-                            if len(input_lines) == 2 and len(output_lines) == 1:
-                                op_type = "binary arithmetic"
-                            elif len(input_lines) == 1 and len(output_lines) == 1:
-                                op_type = "unary"
-                
-                # Get test point information
-                test_point_content = ""
-                if direct_request:
-                    # Use content from direct-request file
-                    logger.info(f"Using direct request file: {direct_request}")
-                    with open(direct_request, 'r', encoding='utf-8') as f:
-                        test_point_content = f.read()
-                elif test_points_csv and test_point:
-                    test_points_dict = read_csv_to_dict(test_points_csv)
-                    if test_point in test_points_dict:
-                        test_point_data = test_points_dict[test_point]
-                        test_point_content = f"测试点: {test_point}\n"
-                        for key, value in test_point_data.items():
-                            if value:  # Only include non-empty values
-                                test_point_content += f"{key}: {value}\n"
-                        logger.info(f"Using specified test point: {test_point}")
-                elif test_point_path:
-                    test_point_content = read_file_content(test_point_path)
-                if not test_point_content:
-                    test_point_content = "测试基本功能，确保算子能正确处理输入并生成预期的输出"
+                    all_operator_params.append(op_params)
                 
-                # Get graph pattern information
-                graph_pattern_content = ""
-                if graph_patterns_csv:
-                    graph_patterns_dict = read_csv_to_dict(graph_patterns_csv)
-                    if graph_pattern and graph_pattern in graph_patterns_dict:
-                        # Use specified graph pattern
-                        graph_pattern_data = graph_patterns_dict[graph_pattern]
-                        graph_pattern_content = f"构图模式: {graph_pattern}\n"
-                        for key, value in graph_pattern_data.items():
-                            if value:  # Only include non-empty values
-                                graph_pattern_content += f"{key}: {value}\n"
-                        logger.info(f"Using specified graph pattern: {graph_pattern}")
-                    elif graph_patterns_dict:  # Use default (first) graph pattern if none specified
-                        first_key = next(iter(graph_patterns_dict))
-                        graph_pattern_data = graph_patterns_dict[first_key]
-                        graph_pattern_content = f"构图模式: {first_key}\n"
-                        for key, value in graph_pattern_data.items():
-                            if value:  # Only include non-empty values
-                                graph_pattern_content += f"{key}: {value}\n"
-                        logger.info(f"Using default graph pattern: {first_key}")
-                
-                # Read IR JSON format requirements
-                ir_json_format = ""
-                if ir_json_format_path:
-                    ir_json_format = read_file_content(ir_json_format_path)
-                if not ir_json_format:
-                    ir_json_format = "IR JSON应包含模型的inputs、outputs和nodes信息，确保算子的连接和属性正确"
-                
-                additional_requirements = ""
-                if add_req:
-                    additional_requirements = add_req
-                if not additional_requirements:
-                    additional_requirements = "无"
-                
-                # Create replacements
-                replacements = {
-                    "算子名": operator_string if operator_string else "",
-                    "算子参数": operator_params if operator_string else "",
-                    "算子类型": op_type,
-                    "用例要求": test_point_content,
-                    "IR_JSON要求": ir_json_format,
-                    "附加要求": additional_requirements
-                }
-                
-                if graph_pattern_content:
-                    replacements["构图模式"] = graph_pattern_content
-                
-                # If this is a retry attempt, use the retry template
-                if current_retry > 0 and last_json_content and last_error_content:
-                    # Create retry prompt using retry_testcase.prompt
-                    retry_template = find_resource_path(os.path.join('prompts', 'retry_testcase.prompt'))
-                    if not retry_template:
-                        logger.error("Could not find retry_testcase.prompt template")
-                        return False
-                    
-                    with open(retry_template, 'r', encoding='utf-8') as f:
-                        retry_prompt_content = f.read()
-                    
-                    # Fill in the retry template
-                    retry_prompt_content = retry_prompt_content.replace("{prompt内容}", last_prompt if last_prompt else "")
-                    retry_prompt_content = retry_prompt_content.replace("{IR_JSON内容}", last_json_content)
-                    retry_prompt_content = retry_prompt_content.replace("{报错内容}", last_error_content)
-                    
-                    # Save the retry prompt to a temporary file
-                    temp_prompt_file = os.path.join(current_output_dir, f"retry_prompt.txt")
-                    with open(temp_prompt_file, 'w', encoding='utf-8') as f:
-                        f.write(retry_prompt_content)
-                    
-                    direct_prompt = temp_prompt_file
-                    template_path = ""
+                # Combine all operator parameters for multi-operator cases
+                if len(operators_list) > 1:
+                    combined_params = "\n\n".join([f"算子: {op}\n{params}" for op, params in zip(operators_list, all_operator_params)])
+                    operator_params = combined_params
+                    op_type = "composite"
                 else:
-                    # Find template
-                    template_path = find_resource_path(os.path.join('prompts', 'op_testcase.prompt'))
-                    if not template_path:
-                        logger.error("Could not find op_testcase.prompt template")
-                        return False
-                    
-                    logger.info(f"Using template: {template_path}")
+                    operator_params = all_operator_params[0]
+                    # Determine operator type for single operator
+                    op_type = _operator_type(operator_params)
+            
+            # Get test point information
+            test_point_content = ""
+            if direct_request:
+                # Use content from direct-request file
+                logger.info(f"Using direct request file: {direct_request}")
+                test_point_content = _read_text_file(direct_request)
+            elif test_points_csv and test_point:
+                test_points_dict = read_csv_to_dict(test_points_csv)
+                if test_point in test_points_dict:
+                    test_point_data = test_points_dict[test_point]
+                    test_point_content = f"测试点: {test_point}\n"
+                    for key, value in test_point_data.items():
+                        if value:  # Only include non-empty values
+                            test_point_content += f"{key}: {value}\n"
+                    logger.info(f"Using specified test point: {test_point}")
+            elif test_point_path:
+                test_point_content = read_file_content(test_point_path)
+            if not test_point_content:
+                test_point_content = "测试基本功能，确保算子能正确处理输入并生成预期的输出"
+            
+            # Get graph pattern information
+            graph_pattern_content = ""
+            if graph_patterns_csv:
+                graph_patterns_dict = read_csv_to_dict(graph_patterns_csv)
+                if graph_pattern and graph_pattern in graph_patterns_dict:
+                    # Use specified graph pattern
+                    graph_pattern_data = graph_patterns_dict[graph_pattern]
+                    graph_pattern_content = f"构图模式: {graph_pattern}\n"
+                    for key, value in graph_pattern_data.items():
+                        if value:  # Only include non-empty values
+                            graph_pattern_content += f"{key}: {value}\n"
+                    logger.info(f"Using specified graph pattern: {graph_pattern}")
+                elif graph_patterns_dict:  # Use default (first) graph pattern if none specified
+                    first_key = next(iter(graph_patterns_dict))
+                    graph_pattern_data = graph_patterns_dict[first_key]
+                    graph_pattern_content = f"构图模式: {first_key}\n"
+                    for key, value in graph_pattern_data.items():
+                        if value:  # Only include non-empty values
+                            graph_pattern_content += f"{key}: {value}\n"
+                    logger.info(f"Using default graph pattern: {first_key}")
+            
+            # Read IR JSON format requirements
+            ir_json_format = ""
+            if ir_json_format_path:
+                ir_json_format = read_file_content(ir_json_format_path)
+            if not ir_json_format:
+                ir_json_format = "IR JSON应包含模型的inputs、outputs和nodes信息，确保算子的连接和属性正确"
+            
+            additional_requirements = ""
+            if add_req:
+                additional_requirements = add_req
+            if not additional_requirements:
+                additional_requirements = "无"
+            
+            # Create replacements
+            replacements = {
+                "算子名": operator_string if operator_string else "",
+                "算子参数": operator_params if operator_string else "",
+                "算子类型": op_type,
+                "用例要求": test_point_content,
+                "IR_JSON要求": ir_json_format,
+                "附加要求": additional_requirements
+            }
+            
+            if graph_pattern_content:
+                replacements["构图模式"] = graph_pattern_content
+            
+            if operator_string:
+                logger.info(f"Generating test case for {operator_string}")
+            else:
+                logger.info("Generating test case with custom requirements")
+            
+            last_prompt = _fill_placeholders(_load_template(template_path), replacements)
+        
+        prompt_text = last_prompt
+        if debug:
+            _atomic_write_bytes(os.path.join(current_output_dir, "initial_prompt.txt"), last_prompt.encode('utf-8'))
+        
+        retry_template_path = _resolve(os.path.join('prompts', 'retry_testcase.prompt'))
+        retry_template = _load_template(retry_template_path) if retry_template_path else None
+        # Renames of a failed attempt's files, finished before the next attempt writes
+        pending_renames = []
+
+        while current_retry <= max_retries:
+            attempt_prefix = f"attempt_{current_retry}_"
+            
+            # If this is a retry attempt, use the retry template
+            if current_retry > 0 and last_json_content and last_error_content:
+                if not retry_template:
+                    logger.error("Could not find retry_testcase.prompt template")
+                    return False
                 
-                if operator_string:
-                    logger.info(f"Generating test case for {operator_string}")
-                else:
-                    logger.info("Generating test case with custom requirements")
+                # Fill in the retry template
+                retry_prompt_content = _fill_placeholders(retry_template, {
+                    "prompt内容": last_prompt if last_prompt else "",
+                    "IR_JSON内容": last_json_content.decode('utf-8', errors='replace'),
+                    "报错内容": last_error_content
+                })
                 
-                # Save the current prompt for potential retry
-                if template_path and current_retry == 0:
-                    with open(template_path, 'r', encoding='utf-8') as f:
-                        current_prompt = f.read()
-                    for key, value in replacements.items():
-                        current_prompt = current_prompt.replace(f"{{{key}}}", value)
-                    last_prompt = current_prompt
-                    with open(os.path.join(current_output_dir, f"initial_prompt.txt"), 'w', encoding='utf-8') as f:
-                        f.write(last_prompt)
-
-                success = generator.generate(
-                    template_path,
-                    replacements,
-                    current_output_dir,
-                    base_output_name,
-                    "json",
-                    max_retries=3,
-                    debug=debug,
-                    show_output=not quiet,
-                    direct_prompt_file=direct_prompt
-                )
-
+                prompt_text = retry_prompt_content
+                if debug:
+                    _atomic_write_bytes(os.path.join(current_output_dir, "retry_prompt.txt"),
+                                        retry_prompt_content.encode('utf-8'))
+            
+            wait(pending_renames)
+            pending_renames = []
+            
+            success = generator.generate(
+                "",  # The prompt is already rendered
+                {},
+                current_output_dir,
+                base_output_name,
+                "json",
+                max_retries=3,
+                debug=debug,
+                show_output=not quiet,
+                name_key="Case_Name",
+                prompt_text=prompt_text
+            )
             
             if success:
                 if operator_string:
@@ -1588,33 +2058,14 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
                 else:
                     display.success("Successfully generated test case with custom requirements")
 
-                original_json_path = os.path.join(current_output_dir, f"{base_output_name}.json")
-                json_file = original_json_path  # Default in case of error
-                case_name = base_output_name
-
-                try:
-                    with open(original_json_path, 'r', encoding='utf-8') as f:
-                        json_data = json.load(f)
-
-                    case_name = json_data.get("Case_Name", base_output_name)
-                    case_name = re.sub(r'[\\/:*?"<>|]', '_', case_name)  # Sanitize for filename
-                    
-                    new_json_path = os.path.join(current_output_dir, f"{case_name}.json")
-                    if original_json_path != new_json_path:
-                        if os.path.exists(new_json_path):
-                            os.remove(new_json_path)
-                        os.rename(original_json_path, new_json_path)
-                        display.debug(f"Renamed output file to: {new_json_path}")
-                    json_file = new_json_path
-
-                except (IOError, json.JSONDecodeError, KeyError) as e:
-                    display.debug(f"Failed to process generated JSON for renaming: {e}. Proceeding with original filename.")
+                # The generator already named the file after its Case_Name
+                json_file = generator.last_output_file
+                case_name = os.path.splitext(os.path.basename(json_file))[0]
                 
                 # If convert_to_onnx is True, run irjson-convert
                 if convert_to_onnx:
-                    # Save the current JSON content for potential retry
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        last_json_content = f.read()
+                    # Keep the JSON bytes for a potential retry; decoded only if one happens
+                    last_json_content = generator.last_json_bytes
                     
                     display.info("🔄 Converting JSON to ONNX model...")
                     conversion_success, model_path = run_irjson_convert(json_file, current_output_dir)
@@ -1627,12 +2078,7 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
                             if src_path and os.path.isdir(src_path):
                                 model_dir_name = os.path.basename(src_path)
                                 dest_path = os.path.join(output_dir, model_dir_name)
-                                
-                                if os.path.exists(dest_path):
-                                    shutil.rmtree(dest_path)
-                                    logger.warning(f"Removed existing directory at destination: {dest_path}")
-
-                                shutil.move(src_path, dest_path)
+                                _move_dir(src_path, dest_path)
                                 display.success(f"Successfully converted to ONNX model: {dest_path}")
                                 display.debug(f"Process files are kept in {process_dir}")
                             elif src_path:
@@ -1651,60 +2097,54 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
                         
                         # Save error log content for retry
                         log_file = os.path.join(current_output_dir, 'irjson_convert.log')
-                        if os.path.exists(log_file):
-                            with open(log_file, 'r', encoding='utf-8') as f:
-                                last_error_content = f.read()
-                            # Rename the log file for this attempt
-                            renamed_log_path = os.path.join(current_output_dir, f"{attempt_prefix}irjson_convert.log")
-                            os.rename(log_file, renamed_log_path)
-
-                        # Rename the failed JSON file
-                        if os.path.exists(json_file):
-                            renamed_json_path = os.path.join(current_output_dir, f"{attempt_prefix}{os.path.basename(json_file)}")
-                            os.rename(json_file, renamed_json_path)
-                            display.warning(f"Conversion failed. Renamed failed JSON to {renamed_json_path}")
-
-                        # Rename the response file
-                        response_file = os.path.join(current_output_dir, f"{base_output_name}_response.txt")
-                        if os.path.exists(response_file):
-                            renamed_response_path = os.path.join(current_output_dir, f"{attempt_prefix}{base_output_name}_response.txt")
-                            os.rename(response_file, renamed_response_path)
-
-                        # Rename the prompt file for this attempt
-                        prompt_file_to_rename = ""
-                        if current_retry == 0:
-                            prompt_file_to_rename = os.path.join(current_output_dir, "initial_prompt.txt")
-                        else:
-                            prompt_file_to_rename = os.path.join(current_output_dir, "retry_prompt.txt")
-                        
-                        if os.path.exists(prompt_file_to_rename):
-                             os.rename(prompt_file_to_rename, os.path.join(current_output_dir, f"{attempt_prefix}{os.path.basename(prompt_file_to_rename)}"))
+                        try:
+                            # The stack trace is at the end; keep the retry prompt bounded
+                            last_error_content = _tail(log_file)
+                        except FileNotFoundError:
+                            pass
 
-                        # Rename any partially created ONNX folder
-                        partial_onnx_dir = os.path.join(current_output_dir, case_name)
-                        if os.path.isdir(partial_onnx_dir):
-                            renamed_onnx_dir = os.path.join(current_output_dir, f"{attempt_prefix}{case_name}_failed_onnx")
-                            os.rename(partial_onnx_dir, renamed_onnx_dir)
+                        # The renames run in the background, overlapping the retry backoff
+                        renames = [
+                            (log_file, f"{attempt_prefix}irjson_convert.log"),
+                            (json_file, f"{attempt_prefix}{os.path.basename(json_file)}"),
+                            (os.path.join(current_output_dir, f"{base_output_name}_response.txt"),
+                             f"{attempt_prefix}{base_output_name}_response.txt"),
+                            # Any partially created ONNX folder
+                            (os.path.join(current_output_dir, case_name), f"{attempt_prefix}{case_name}_failed_onnx"),
+                        ]
+                        # The prompt file for this attempt, only written in debug mode
+                        if debug:
+                            prompt_file_name = "initial_prompt.txt" if current_retry == 0 else "retry_prompt.txt"
+                            renames.append((os.path.join(current_output_dir, prompt_file_name),
+                                            f"{attempt_prefix}{prompt_file_name}"))
+                        for src_path, dest_name in renames:
+                            pending_renames.append(_IO_EXEC.submit(
+                                _safe_rename, src_path, os.path.join(current_output_dir, dest_name)))
+                        display.warning(f"Conversion failed. Renaming failed JSON to {attempt_prefix}{os.path.basename(json_file)}")
 
                         if current_retry < max_retries:
                             display.warning(f"ONNX conversion failed, attempting retry {current_retry + 1}/{max_retries}")
+                            _sleep_backoff(current_retry)
                             current_retry += 1
                             continue
                         else:
+                            wait(pending_renames)
                             display.error(f"ONNX conversion failed after all retries. Process files are kept in {process_dir}")
                             return cleanup_and_return(False)
                 else:
                     return cleanup_and_return(True)
             else:
-                if current_retry < max_retries:
-                    display.warning(f"JSON generation failed, attempting retry {current_retry + 1}/{max_retries}")
-                    current_retry += 1
-                    continue
+                # Retryable request failures were already retried with backoff by
+                # _query_llm_with_retry, and invalid JSON by generate() itself, so
+                # another round here would only multiply the requests.
+                if _is_retryable_request_error(generator.last_exception):
+                    display.error(f"JSON generation failed, the LLM request still failed after "
+                                  f"{_LLM_REQUEST_ATTEMPTS} attempts: {generator.last_error}")
                 else:
-                    display.error("JSON generation failed after all retries")
-                    if process_dir:
-                         display.debug(f"Process files are kept in {process_dir}")
-                    return cleanup_and_return(False)
+                    display.error(f"JSON generation failed: {generator.last_error}")
+                if process_dir:
+                    display.debug(f"Process files are kept in {process_dir}")
+                return cleanup_and_return(False)
                 
     except Exception as e:
         display.error(f"Error generating test case: {str(e)}")
@@ -1712,6 +2152,31 @@ def generate_testcase(operator_string: str, output_dir: str, quiet: bool = False
             display.debug(f"Process files are kept in {process_dir}")
         return cleanup_and_return(False)
 
+# Number of log records generate_testcase_with_logs keeps per test case
+_CAPTURED_LOG_LINES = 5000
+
+class _RecentLogHandler(logging.Handler):
+    """Keep the formatted text of the most recent log records in a bounded buffer."""
+    
+    def __init__(self, capacity: int):
+        super().__init__(logging.DEBUG)
+        self.lines = collections.deque(maxlen=capacity)
+    
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+    
+    def getvalue(self) -> str:
+        return "\n".join(self.lines)
+
+# Active generate_testcase_with_logs captures, and the json_generator logger
+# level to restore once none is left
+_log_capture_lock = threading.Lock()
+_log_capture_count = 0
+_log_capture_level = logging.NOTSET
+
 def generate_testcase_with_logs(operator_string: str, output_dir: str, quiet: bool = False,
                                test_point: Optional[str] = None, graph_pattern: Optional[str] = None,
                                add_req: Optional[str] = None, direct_prompt: Optional[str] = None,
@@ -1726,54 +2191,34 @@ def generate_testcase_with_logs(operator_string: str, output_dir: str, quiet: bo
     Returns:
         Tuple of (success, captured_logs, detailed_status)
     """
-    import logging
-    import io
+    global _log_capture_count, _log_capture_level
     
-    # Create a string buffer to capture logs
-    log_capture_string = io.StringIO()
-    log_handler = logging.StreamHandler(log_capture_string)
-    log_handler.setLevel(logging.DEBUG)
+    # Keep the most recent log lines; batch test points may run in parallel,
+    # so only records from this thread are captured
+    log_handler = _RecentLogHandler(_CAPTURED_LOG_LINES)
+    thread_id = threading.get_ident()
+    log_handler.addFilter(lambda record: record.thread == thread_id)
     
-    # Get the logger and add our handler
+    # Get the logger and add our handler; the first capture lowers the level
+    # and the last one restores it
     logger = logging.getLogger('json_generator')
-    original_level = logger.level
-    logger.setLevel(logging.DEBUG)
+    with _log_capture_lock:
+        if _log_capture_count == 0:
+            _log_capture_level = logger.level
+            logger.setLevel(logging.DEBUG)
+        _log_capture_count += 1
     logger.addHandler(log_handler)
     
     try:
         # Run the original function
         success = generate_testcase(
             operator_string, output_dir, quiet, test_point, graph_pattern,
-            add_req, direct_prompt, direct_request, convert_to_onnx, max_retries, debug
+            add_req, direct_prompt, direct_request, convert_to_onnx, max_retries, debug,
+            global_generator=global_generator
         )
         
         # Get captured logs
-        captured_logs = log_capture_string.getvalue()
-        
-        # If we have a global generator, accumulate token stats from the internal generator
-        if global_generator:
-            # Extract token information from logs if possible
-            token_pattern_input = r'estimated tokens: (\d+) input'
-            token_pattern_output = r'(\d+) output'
-            
-            for line in captured_logs.split('\n'):
-                if 'estimated tokens:' in line:
-                    import re
-                    input_match = re.search(token_pattern_input, line)
-                    output_match = re.search(token_pattern_output, line)
-                    if input_match and output_match:
-                        input_tokens = int(input_match.group(1))
-                        output_tokens = int(output_match.group(1))
-                        
-                        # Manually update global generator stats
-                        global_generator.token_stats['total_input_tokens'] += input_tokens
-                        global_generator.token_stats['total_output_tokens'] += output_tokens
-                        global_generator.token_stats['total_tokens'] += input_tokens + output_tokens
-                        global_generator.token_stats['requests_count'] += 1
-                        
-                        if global_generator.token_stats['start_time'] is None:
-                            global_generator.token_stats['start_time'] = time.time()
-                        global_generator.token_stats['end_time'] = time.time()
+        captured_logs = log_handler.getvalue()
         
         # Analyze the results more thoroughly
         detailed_status = analyze_generation_results(output_dir, captured_logs, convert_to_onnx)
@@ -1783,8 +2228,119 @@ def generate_testcase_with_logs(operator_string: str, output_dir: str, quiet: bo
     finally:
         # Clean up logging
         logger.removeHandler(log_handler)
-        logger.setLevel(original_level)
-        log_capture_string.close()
+        with _log_capture_lock:
+            _log_capture_count -= 1
+            if _log_capture_count == 0:
+                logger.setLevel(_log_capture_level)
+
+def _find_first_file(root: str, match) -> Optional[str]:
+    """
+    Return the first file under root whose name satisfies match, or None.
+    
+    Like os.walk, a directory's own files are checked before its subdirectories,
+    but the scan stops at the first hit instead of listing the whole tree.
+    """
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return None
+    
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir():
+            # os.walk does not descend into symlinked directories either
+            if not entry.is_symlink():
+                subdirs.append(entry.path)
+        elif match(entry.name):
+            return entry.path
+    
+    for subdir in subdirs:
+        found = _find_first_file(subdir, match)
+        if found:
+            return found
+    return None
+
+def _locate_output_file(primary: str, root: str, match) -> Tuple[str, Optional[int]]:
+    """
+    Return the file to check and its size (None if no file was found).
+    
+    The primary path costs a single stat; the tree under root is only scanned
+    when it is missing.
+    """
+    try:
+        return primary, os.stat(primary).st_size
+    except OSError:
+        pass
+    
+    found = _find_first_file(root, match)
+    if found:
+        try:
+            return found, os.stat(found).st_size
+        except OSError:
+            pass
+    return primary, None
+
+# (needles that must all appear in the lower-cased line, message, status key, status value),
+# checked in order; the first matching rule wins
+_LOG_SUCCESS_RULES = (
+    (('✅ successfully converted to onnx model',), "ONNX conversion successful", 'onnx_status', 'success'),
+    (('✅ generated valid json file',), "JSON generation successful", 'json_status', 'success'),
+    (('successfully converted', 'onnx model'), "ONNX conversion successful", 'onnx_status', 'success'),
+    (('generated valid json file:',), "JSON generation successful", 'json_status', 'success'),
+    # Status is left to the file checks
+    (('✅ successfully generated test case',), "Test case generation successful", None, None),
+    (('[success]', 'onnx'), "ONNX conversion successful", 'onnx_status', 'success'),
+    (('[success]', 'json'), "JSON generation successful", 'json_status', 'success'),
+)
+_LOG_FAILURE_RULES = (
+    (('failed to convert', 'onnx'), "ONNX conversion failed", 'onnx_status', 'failed'),
+    (('onnx conversion failed',), "ONNX conversion failed", 'onnx_status', 'failed'),
+    (('invalid json',), "Invalid JSON generated", 'json_status', 'failed'),
+    (('json generation failed',), "JSON generation failed", 'json_status', 'failed'),
+)
+
+def _apply_log_rules(result: Dict[str, Any], line_lower: str, rules, messages_key: str) -> bool:
+    """Apply the first rule whose needles all appear in line_lower; return whether one matched."""
+    for needles, message, status_key, status in rules:
+        if all(needle in line_lower for needle in needles):
+            result[messages_key].append(message)
+            if status_key:
+                result[status_key] = status
+            return True
+    return False
+
+def _classify_log_line(result: Dict[str, Any], line: str) -> None:
+    """Update result with the success or error message found in one log line, if any."""
+    line_lower = line.lower()
+    
+    # Look for success patterns based on actual log output
+    if _apply_log_rules(result, line_lower, _LOG_SUCCESS_RULES, 'success_messages'):
+        return
+    if '✅' in line and any(keyword in line_lower for keyword in ('json', 'onnx', 'generated', 'converted')):
+        result['success_messages'].append(line.strip())
+        # Try to determine what succeeded from the message
+        if 'onnx' in line_lower:
+            result['onnx_status'] = 'success'
+        elif 'json' in line_lower:
+            result['json_status'] = 'success'
+        return
+    
+    # Look for error patterns - more comprehensive
+    if _apply_log_rules(result, line_lower, _LOG_FAILURE_RULES, 'error_messages'):
+        return
+    if 'failed to generate' in line_lower:
+        if 'json' in line_lower:
+            result['json_status'] = 'failed'
+        if 'onnx' in line_lower:
+            result['onnx_status'] = 'failed'
+        result['error_messages'].append(line.strip())
+    elif '❌' in line or ('error' in line_lower and any(keyword in line_lower for keyword in ('generation', 'convert', 'json', 'onnx', 'failed'))):
+        result['error_messages'].append(line.strip())
+    elif 'return code:' in line_lower and 'return code: 0' not in line_lower:
+        # Non-zero return codes indicate failure
+        result['error_messages'].append("Process returned error code")
+        if 'onnx' in line_lower or 'convert' in line_lower:
+            result['onnx_status'] = 'failed'
 
 def analyze_generation_results(output_dir: str, captured_logs: str, convert_to_onnx: bool) -> Dict[str, Any]:
     """Analyze generation results based on output files and logs."""
@@ -1803,107 +2359,38 @@ def analyze_generation_results(output_dir: str, captured_logs: str, convert_to_o
     json_file = os.path.join(output_dir, "operator_testcase.json")
     onnx_file = os.path.join(output_dir, "operator_testcase.onnx")
     
-    # Also check for JSON files in subdirectories (as they might be generated with different names)
-    json_files_found = []
-    onnx_files_found = []
-    
-    if os.path.exists(output_dir):
-        for root, dirs, files in os.walk(output_dir):
-            for file in files:
-                if file.endswith('.json') and 'test_metadata' not in file:
-                    json_files_found.append(os.path.join(root, file))
-                elif file.endswith('.onnx'):
-                    onnx_files_found.append(os.path.join(root, file))
+    # Fall back to the first JSON file in subdirectories (it might be generated with a different name)
+    json_file_to_check, json_size = _locate_output_file(
+        json_file, output_dir, lambda name: name.endswith('.json') and 'test_metadata' not in name)
     
-    # Check JSON file - use the primary file or any found JSON file
-    json_file_to_check = json_file if os.path.exists(json_file) else (json_files_found[0] if json_files_found else json_file)
-    
-    if os.path.exists(json_file_to_check) and os.path.getsize(json_file_to_check) > 0:
+    if json_size:
         result['json_file_exists'] = True
         try:
-            with open(json_file_to_check, 'r', encoding='utf-8') as f:
-                json.load(f)
+            with open(json_file_to_check, 'rb') as f:
+                _loads(f.read())
             result['json_valid'] = True
             result['json_status'] = 'success'
         except json.JSONDecodeError as e:
             result['error_messages'].append(f"JSON file invalid: {str(e)}")
     else:
-        if not json_files_found:
+        if json_size is None:
             result['error_messages'].append("JSON file not found or empty")
     
     # Check ONNX file if conversion was requested - use any found ONNX file
     if convert_to_onnx:
-        onnx_file_to_check = onnx_file if os.path.exists(onnx_file) else (onnx_files_found[0] if onnx_files_found else onnx_file)
+        _, onnx_size = _locate_output_file(
+            onnx_file, output_dir, lambda name: name.endswith('.onnx'))
         
-        if os.path.exists(onnx_file_to_check) and os.path.getsize(onnx_file_to_check) > 0:
+        if onnx_size:
             result['onnx_file_exists'] = True
             result['onnx_status'] = 'success'
         else:
-            if not onnx_files_found:
+            if onnx_size is None:
                 result['error_messages'].append("ONNX file not found or empty")
     
     # Analyze logs for specific success/error patterns
-    log_lines = captured_logs.split('\n')
-    for line in log_lines:
-        line_lower = line.lower()
-        line_stripped = line.strip()
-        
-        # Look for success patterns based on actual log output
-        if '✅ successfully converted to onnx model' in line_lower:
-            result['success_messages'].append("ONNX conversion successful")
-            result['onnx_status'] = 'success'
-        elif '✅ generated valid json file' in line_lower:
-            result['success_messages'].append("JSON generation successful") 
-            result['json_status'] = 'success'
-        elif 'successfully converted' in line_lower and 'onnx model' in line_lower:
-            result['success_messages'].append("ONNX conversion successful")
-            result['onnx_status'] = 'success'
-        elif 'generated valid json file:' in line_lower:
-            result['success_messages'].append("JSON generation successful")
-            result['json_status'] = 'success'
-        elif '✅ successfully generated test case' in line_lower:
-            result['success_messages'].append("Test case generation successful")
-            # Don't set status here as it's handled by file checks
-        elif '[success]' in line_lower and 'onnx' in line_lower:
-            result['success_messages'].append("ONNX conversion successful")
-            result['onnx_status'] = 'success'
-        elif '[success]' in line_lower and ('json' in line_lower or 'ir json' in line_lower):
-            result['success_messages'].append("JSON generation successful")
-            result['json_status'] = 'success'
-        elif '✅' in line and any(keyword in line_lower for keyword in ['json', 'onnx', 'generated', 'converted']):
-            result['success_messages'].append(line_stripped)
-            # Try to determine what succeeded from the message
-            if 'onnx' in line_lower:
-                result['onnx_status'] = 'success'
-            elif 'json' in line_lower:
-                result['json_status'] = 'success'
-            
-        # Look for error patterns - more comprehensive
-        elif 'failed to convert' in line_lower and 'onnx' in line_lower:
-            result['error_messages'].append("ONNX conversion failed")
-            result['onnx_status'] = 'failed'
-        elif 'onnx conversion failed' in line_lower:
-            result['error_messages'].append("ONNX conversion failed")
-            result['onnx_status'] = 'failed'
-        elif 'invalid json' in line_lower:
-            result['error_messages'].append("Invalid JSON generated")
-            result['json_status'] = 'failed'
-        elif 'json generation failed' in line_lower:
-            result['error_messages'].append("JSON generation failed")
-            result['json_status'] = 'failed'
-        elif 'failed to generate' in line_lower:
-            if 'json' in line_lower:
-                result['json_status'] = 'failed'
-            if 'onnx' in line_lower:
-                result['onnx_status'] = 'failed'
-            result['error_messages'].append(line_stripped)
-        elif '❌' in line or ('error' in line_lower and any(keyword in line_lower for keyword in ['generation', 'convert', 'json', 'onnx', 'failed'])):
-            result['error_messages'].append(line_stripped)
-        elif 'return code:' in line_lower and 'return code: 0' not in line_lower:
-            # Non-zero return codes indicate failure
-            result['error_messages'].append("Process returned error code")
-            if 'onnx' in line_lower or 'convert' in line_lower:
-                result['onnx_status'] = 'failed'
+    for line in captured_logs.splitlines():
+        _classify_log_line(result, line)
     
     # Final status determination based on comprehensive analysis
     if result['json_valid'] and result['json_file_exists']:
@@ -1914,72 +2401,61 @@ def analyze_generation_results(output_dir: str, captured_logs: str, convert_to_o
     elif not convert_to_onnx:
         result['onnx_status'] = 'not_required'
     
+    # Several patterns map to the same message; keep each once, in first-seen order
+    result['error_messages'] = list(dict.fromkeys(result['error_messages']))
+    result['success_messages'] = list(dict.fromkeys(result['success_messages']))
+    
     return result
 
 def generate_equivalent_command(prompt_file: str, output_dir: str, convert_to_onnx: bool, 
-                               max_retries: int, debug: bool, row_data: Dict[str, str], 
-                               original_args: Optional[Dict[str, Any]] = None) -> str:
-    """Generate the equivalent ai-json-generator command for a single test case."""
-    
-    # Create a rendered prompt file for this specific test case
-    import tempfile
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.prompt.txt', delete=False) as f:
-        # Read the original template
-        with open(prompt_file, 'r', encoding='utf-8') as template_file:
-            template_content = template_file.read()
-        
-        # Render with Jinja2
-        try:
-            jinja_template = Template(template_content)
-            rendered_content = jinja_template.render(**row_data)
-            f.write(rendered_content)
-            temp_prompt_file = f.name
-        except Exception:
-            # Fallback to simple replacement
-            rendered_content = template_content
-            for key, value in row_data.items():
-                rendered_content = rendered_content.replace(f"{{{key}}}", value)
-            f.write(rendered_content)
-            temp_prompt_file = f.name
+                               max_retries: int, debug: bool, 
+                               original_args: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Generate the argv of the equivalent ai-json-generator command for a single test case.
+    
+    prompt_file is the test case's already rendered prompt (rendered_prompt.txt).
+    Use shlex.join() to display it as a shell command.
+    """
     
     # Build the command
-    cmd_parts = ["ai-json-generator"]
-    cmd_parts.append(f"--direct-prompt {temp_prompt_file}")
-    cmd_parts.append(f"-o {output_dir}")
+    argv = ["ai-json-generator", "--direct-prompt", prompt_file, "-o", output_dir]
     
     if convert_to_onnx:
-        cmd_parts.append("--convert-to-onnx")
+        argv.append("--convert-to-onnx")
     
     if max_retries > 1:
-        cmd_parts.append(f"--max-retries {max_retries}")
+        argv.extend(["--max-retries", str(max_retries)])
     
     if debug:
-        cmd_parts.append("--debug")
+        argv.append("--debug")
     
     # Add any other original arguments
     if original_args:
         if original_args.get('quiet'):
-            cmd_parts.append("--quiet")
+            argv.append("--quiet")
         if original_args.get('no_color'):
-            cmd_parts.append("--no-color")
-    
-    command = " ".join(cmd_parts)
-    
-    # Clean up temp file
-    try:
-        os.unlink(temp_prompt_file)
-    except:
-        pass
+            argv.append("--no-color")
     
-    return command
+    return argv
 
 def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str, 
                             convert_to_onnx: bool = False, max_retries: int = 1, 
                             debug: bool = False, quiet: bool = False,
-                            original_args: Optional[Dict[str, Any]] = None) -> bool:
-    """Generate test cases for all rows in a CSV file using Jinja2 template."""
+                            original_args: Optional[Dict[str, Any]] = None,
+                            concurrency: Optional[int] = None) -> bool:
+    """Generate test cases for all rows in a CSV file using Jinja2 template.
+    
+    Up to concurrency test points are processed at once; it defaults to the
+    AI_JSON_GENERATOR_CONCURRENCY environment variable, or 1.
+    """
     display = get_display()
     
+    if concurrency is None:
+        try:
+            concurrency = int(os.environ.get('AI_JSON_GENERATOR_CONCURRENCY', '1'))
+        except ValueError:
+            display.warning("Ignoring invalid AI_JSON_GENERATOR_CONCURRENCY, processing one test point at a time")
+            concurrency = 1
+    
     # Initialize a shared generator for token statistics
     from .generate_json import LLMJsonGenerator
     global_generator = LLMJsonGenerator(display=display)
@@ -2003,6 +2479,13 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
         display.error(f"Error reading prompt file: {e}")
         return False
     
+    # Compile the template once for all rows
+    try:
+        jinja_template = _get_compiled_template(prompt_template)
+    except Exception as e:
+        display.error(f"Error compiling prompt template: {e}")
+        return False
+    
     # Create main output directory
     os.makedirs(output_dir, exist_ok=True)
     
@@ -2018,7 +2501,8 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
         completed_count = len(completed_tests)
         display.info(f"Found {completed_count} previously completed test cases, resuming from where we left off")
     
-    # Process each row in CSV
+    # Collect the rows to process
+    pending = []
     for i, row_data in enumerate(csv_data, 1):
         # Check if this test is already completed successfully
         if i in completed_tests:
@@ -2027,27 +2511,27 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
                 if not convert_to_onnx or existing_result.get('onnx_status') == 'success':
                     display.info(f"Skipping test point {i}/{total_count} (already completed successfully)")
                     continue
-        
+        pending.append((i, row_data))
+    
+    def process_test_point(i: int, row_data: Dict[str, str], quiet: bool) -> bool:
+        """Generate one test point and save its result; returns whether it fully succeeded."""
         display.info(f"Processing test point {i}/{total_count}")
         
         # Create subdirectory for this test point
         # Use the first column value as the subdirectory name, fallback to index
-        first_key = list(row_data.keys())[0] if row_data else str(i)
+        first_key = next(iter(row_data), str(i))
         first_value = row_data.get(first_key, str(i))
         
         # Sanitize directory name
-        dir_name = re.sub(r'[^\w\-_\.]', '_', str(first_value))
-        test_output_dir = os.path.join(output_dir, f"test_{i:03d}_{dir_name}")
+        dir_name = _DIR_NAME_SANITIZE_RE.sub('_', str(first_value))
+        test_dir_name = f"test_{i:03d}_{dir_name}"
+        test_output_dir = os.path.join(output_dir, test_dir_name)
         test_name = f"{first_value}"
         
-        # Generate and display the equivalent ai-json-generator command for this test case
-        equivalent_command = generate_equivalent_command(prompt_file, test_output_dir, convert_to_onnx, max_retries, debug, row_data, original_args)
-        display.info(f"📋 Equivalent command for test case {i}:")
-        display.info(f"   {equivalent_command}")
-        
         json_status = "failed"
         onnx_status = "not_attempted" if convert_to_onnx else "not_required"
         error_message = ""
+        succeeded = False
         
         try:
             os.makedirs(test_output_dir, exist_ok=True)
@@ -2057,20 +2541,24 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
             
             # Render template with row data
             try:
-                jinja_template = Template(prompt_template)
-                rendered_prompt = jinja_template.render(**row_data)
-                
-                with open(temp_prompt_file, 'w', encoding='utf-8') as f:
-                    f.write(rendered_prompt)
+                # Stream the rendered blocks straight into the file instead of
+                # building the whole prompt string first
+                with open(temp_prompt_file, 'wb') as f:
+                    jinja_template.stream(row_data).dump(f, encoding='utf-8')
                 
                 display.debug(f"Rendered prompt for test point {i} using variables: {list(row_data.keys())}")
                 
+                # Display the equivalent ai-json-generator command, which reuses the rendered prompt
+                equivalent_command = generate_equivalent_command(temp_prompt_file, test_output_dir, convert_to_onnx, max_retries, debug, original_args)
+                display.info(f"📋 Equivalent command for test case {i}:")
+                display.info(f"   {shlex.join(equivalent_command)}")
+                
             except Exception as e:
                 error_message = f"Template rendering error: {str(e)}"
                 display.error(f"Error rendering template for test point {i}: {e}")
                 save_batch_result(results_csv_path, i, test_name, row_data, 
-                                json_status, onnx_status, os.path.basename(test_output_dir), error_message)
-                continue
+                                json_status, onnx_status, test_dir_name, error_message)
+                return False
             
             # Generate test case using the rendered prompt with detailed logging
             success, captured_logs, detailed_status = generate_testcase_with_logs(
@@ -2111,7 +2599,7 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
             
             # Update success count based on comprehensive analysis
             if json_status == "success" and (not convert_to_onnx or onnx_status == "success"):
-                success_count += 1
+                succeeded = True
                 
                 # Save test point metadata with detailed analysis
                 metadata = {
@@ -2127,8 +2615,8 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
                     "error_messages": error_messages
                 }
                 metadata_file = os.path.join(test_output_dir, "test_metadata.json")
-                with open(metadata_file, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, indent=2, ensure_ascii=False)
+                with open(metadata_file, 'wb') as f:
+                    f.write(_dumps_pretty(metadata))
             else:
                 # Display failure with specific reasons
                 failure_reasons = []
@@ -2145,14 +2633,32 @@ def generate_batch_testcases(csv_file: str, prompt_file: str, output_dir: str,
             
             # Save result to CSV
             save_batch_result(results_csv_path, i, test_name, row_data, 
-                            json_status, onnx_status, os.path.basename(test_output_dir), error_message)
+                            json_status, onnx_status, test_dir_name, error_message)
                 
         except Exception as e:
             error_message = f"Processing error: {str(e)}"
             display.error(f"Error processing test point {i}: {e}")
             save_batch_result(results_csv_path, i, test_name, row_data, 
-                            json_status, onnx_status, os.path.basename(test_output_dir), error_message)
-            continue
+                            json_status, onnx_status, test_dir_name, error_message)
+            return False
+
+        return succeeded
+    
+    try:
+        if concurrency > 1 and len(pending) > 1:
+            # Tests are I/O bound (LLM requests and irjson-convert), so they run in threads.
+            # Only one live LLM progress display can be shown at a time, hence quiet.
+            display.info(f"Processing {len(pending)} test points with up to {concurrency} concurrent workers")
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai_json_generator_batch') as executor:
+                success_count += sum(executor.map(lambda item: process_test_point(*item, True), pending))
+        else:
+            for i, row_data in pending:
+                if process_test_point(i, row_data, quiet):
+                    success_count += 1
+    finally:
+        # Replace the appended rows with one sorted row per test, and release the
+        # append handle and row map even when the batch is interrupted
+        finalize_batch_results(results_csv_path)
     
     # Print summary
     display.info(f"Batch generation completed: {success_count}/{total_count} test cases generated successfully")
@@ -2186,6 +2692,7 @@ def main():
     parser.add_argument('--batch-csv', help='Path to a CSV file containing test points for batch generation. CSV headers will be used as Jinja2 template variables.')
     parser.add_argument('--convert-to-onnx', action='store_true', help='Convert generated JSON to ONNX model using irjson-convert')
     parser.add_argument('--max-retries', type=int, default=1, help='Maximum number of retry attempts for failed ONNX conversion')
+    parser.add_argument('--concurrency', type=int, help='Number of batch CSV test points to process concurrently (default: AI_JSON_GENERATOR_CONCURRENCY or 1)')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode with detailed logging and intermediate files')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose mode (same as --debug)')
     parser.add_argument('--no-color', action='store_true', help='Disable colored output')
@@ -2251,7 +2758,8 @@ def main():
             max_retries=args.max_retries,
             debug=debug_mode,
             quiet=args.quiet,
-            original_args=original_args
+            original_args=original_args,
+            concurrency=args.concurrency
         )
     else:
         # Original single test case generation
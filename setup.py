@@ -52,6 +52,9 @@ setup(
     ],
     python_requires=">=3.6",
     install_requires=requirements,
+    extras_require={
+        "fast": ["orjson"],
+    },
     entry_points={
         "console_scripts": [
             "ai-json-generator=ai_json_generator.generate_json:main",
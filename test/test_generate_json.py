@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the helper functions in generate_json.
+"""
+
+import contextlib
+import os
+import tempfile
+import threading
+
+import requests
+
+from ai_json_generator import generate_json
+
+
+def _bare_generator(**attrs):
+    """An LLMJsonGenerator built without __init__, so no config file or session is needed."""
+    generator = generate_json.LLMJsonGenerator.__new__(generate_json.LLMJsonGenerator)
+    generator.config = {"model": "test-model"}
+    generator.token_stats = {"requests_count": 0}
+    generator._sampled_chars = 0
+    generator._sampled_tokens = 0
+    generator._stats_lock = threading.Lock()
+    for name, value in attrs.items():
+        setattr(generator, name, value)
+    return generator
+
+
+@contextlib.contextmanager
+def _patched(target, **attrs):
+    """Temporarily replace attributes on target, restoring them on exit."""
+    saved = {name: getattr(target, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(target, name, value)
+
+
+@contextlib.contextmanager
+def _working_directory(path):
+    """Temporarily change the working directory."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def test_fill_placeholders():
+    """Placeholders are replaced in a single pass; unknown ones are kept."""
+    template = "算子: {算子名}\n参数: {算子参数}\n模式: {构图模式}"
+    replacements = {"算子名": "Add", "算子参数": "{算子名} inputs"}
+
+    result = generate_json._fill_placeholders(template, replacements)
+
+    assert result == "算子: Add\n参数: {算子名} inputs\n模式: {构图模式}"
+
+
+def test_fill_placeholders_without_replacements():
+    """An empty replacement dict leaves the template untouched."""
+    assert generate_json._fill_placeholders("{算子名}", {}) == "{算子名}"
+
+
+def test_is_retryable_request_error():
+    """Network errors, 429 and 5xx are retried; client errors are not."""
+    def http_error(status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return requests.HTTPError(response=response)
+
+    assert generate_json._is_retryable_request_error(requests.ConnectionError())
+    assert generate_json._is_retryable_request_error(requests.exceptions.ChunkedEncodingError())
+    assert generate_json._is_retryable_request_error(http_error(429))
+    assert generate_json._is_retryable_request_error(http_error(503))
+    assert not generate_json._is_retryable_request_error(http_error(401))
+    assert not generate_json._is_retryable_request_error(ValueError("bad payload"))
+    assert not generate_json._is_retryable_request_error(None)
+
+
+def test_tail():
+    """Only the last lines of a long log are returned, starting at a line boundary."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_file = os.path.join(temp_dir, "irjson_convert.log")
+        with open(log_file, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {i}\n" for i in range(1000)))
+            f.write("Traceback: bad shape\n")
+
+        tail = generate_json._tail(log_file, max_bytes=64)
+
+        assert len(tail.encode("utf-8")) <= 64
+        assert tail.startswith("line ")
+        assert tail.endswith("Traceback: bad shape\n")
+        assert generate_json._tail(log_file, max_bytes=1 << 20).startswith("line 0\n")
+
+
+def test_atomic_write_bytes():
+    """The file is replaced as a whole and no temporary file is left behind."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "case.json")
+        generate_json._atomic_write_bytes(path, b"old content")
+        generate_json._atomic_write_bytes(path, '{"Case_Name": "加法"}'.encode("utf-8"))
+
+        with open(path, "rb") as f:
+            assert f.read().decode("utf-8") == '{"Case_Name": "加法"}'
+        assert os.listdir(temp_dir) == ["case.json"]
+
+
+def test_fix_malformed_json():
+    """Unquoted keys and values are quoted and code fence lines are dropped."""
+    generator = _bare_generator()
+    malformed = '用例IR JSON如下：\n```json\n{\n  Case_Name: Add_basic,\n  "op": Add\n}\n```'
+
+    fixed = generator._fix_malformed_json(malformed)
+
+    assert fixed == '{\n  "Case_Name": "Add_basic",\n  "op": "Add"\n}'
+
+
+def test_fix_malformed_json_keeps_literals_and_strings():
+    """Numbers, true/false/null and the text inside quoted strings are left alone."""
+    generator = _bare_generator()
+    malformed = '{desc: "axis: 1, mode: same", dims: [1, -3], keep: true, pad: null, mode: same upper}'
+
+    fixed = generator._fix_malformed_json(malformed)
+
+    assert fixed == '{"desc": "axis: 1, mode: same", "dims": [1, -3], "keep": true, "pad": null, "mode": "same upper"}'
+
+
+def test_fix_malformed_json_python_dict():
+    """Single-quoted keys and values become JSON strings without their quote marks."""
+    generator = _bare_generator()
+
+    assert generator._fix_malformed_json("{'a': 1}") == '{"a": 1}'
+    assert generator._fix_malformed_json("{'name': 'Add', 'note': 'it\\'s \"ok\"'}") == \
+        '{"name": "Add", "note": "it\'s \\"ok\\""}'
+    # An unterminated single-quoted value is left for the parse to reject
+    assert generator._fix_malformed_json("{'name': 'Add}") == '{"name": \'"Add"}'
+
+
+def test_extract_code_blocks():
+    """Each fenced block is returned once, with or without a json tag."""
+    generator = _bare_generator()
+    text = '说明\n```json\n{"a": 1}\n```\n中间\n``` JSON {"b": 2} ```\n```\n{"c": 3}\n```\n```\n```'
+
+    blocks = generator._extract_code_blocks(text)
+
+    assert blocks == ['{"a": 1}', '{"b": 2}', '{"c": 3}']
+
+
+def test_first_json_object():
+    """The object at the first brace is returned without the text that follows it."""
+    text = '用例IR JSON如下\n{"Case_Name": "Add", "shape": {"dims": [1, 3]}}\n说明: {无}'
+
+    json_str, parsed = generate_json._first_json_object(text)
+
+    assert json_str == '{"Case_Name": "Add", "shape": {"dims": [1, 3]}}'
+    assert parsed == {"Case_Name": "Add", "shape": {"dims": [1, 3]}}
+    assert generate_json._first_json_object('{Case_Name: Add}') is None
+    assert generate_json._first_json_object('no json here') is None
+
+
+class _FakeStreamResponse:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self, chunk_size=512, decode_unicode=False):
+        return iter(self.lines)
+
+
+def test_iter_sse():
+    """Only data payloads are yielded, and the stream stops at [DONE]."""
+    response = _FakeStreamResponse([
+        b': keep-alive',
+        b'',
+        b'data: {"choices": [{"delta": {"content": "\xe7\x94\xa8\xe4\xbe\x8b"}}]}',
+        b'data:{"choices": [{"delta": {}, "finish_reason": "stop"}]}',
+        b'data: [DONE]',
+        b'data: {"choices": []}',
+    ])
+
+    chunks = list(generate_json._iter_sse(response))
+
+    assert chunks == [
+        {"choices": [{"delta": {"content": "用例"}}]},
+        {"choices": [{"delta": {}, "finish_reason": "stop"}]},
+    ]
+
+
+class _FakeEncoder:
+    """Counts one token per character, like a CJK-heavy prompt."""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+
+def test_count_tokens_uses_sampled_ratio():
+    """Sampled requests are tokenized; the ratio they give is applied to the rest."""
+    generator = _bare_generator(token_stats={"requests_count": 1})
+
+    with _patched(generate_json, _get_encoder=lambda model: None):
+        assert generator._count_tokens(("算子参数",), 400) == 100
+
+    with _patched(generate_json, _get_encoder=lambda model: _FakeEncoder()):
+        assert generator._count_tokens(("算子参数",), 4) == 4
+        generator.token_stats["requests_count"] = 2
+        assert generator._count_tokens(("x" * 400,), 400) == 400
+
+
+class _FakeDisplay:
+    def is_debug(self):
+        return False
+
+
+def test_token_usage_reaches_sink():
+    """Each request's token counts are also recorded on the sink generator."""
+    recorded = []
+
+    class _Recorder:
+        def record_token_usage(self, input_tokens, output_tokens):
+            recorded.append((input_tokens, output_tokens))
+
+    generator = _bare_generator(
+        display=_FakeDisplay(),
+        _add_token_usage=lambda input_tokens, output_tokens, requests_count: None,
+        token_usage_sink=_Recorder(),
+    )
+
+    generator._update_token_stats(120, 30, 0.0)
+
+    assert recorded == [(120, 30)]
+
+
+def test_find_operator_params_rereads_changed_csv():
+    """Lookups are case-insensitive and an edited CSV is parsed again."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = os.path.join(temp_dir, "onnx_operators.csv")
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("operator_name,description\nAdd,old\n")
+        os.utime(csv_path, (1, 1))
+
+        assert generate_json.find_operator_params("ADD", csv_path) == "描述: old"
+
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("operator_name,description\nAdd,new\n")
+        os.utime(csv_path, (2, 2))
+
+        assert generate_json.find_operator_params("add", csv_path) == "描述: new"
+        assert generate_json.find_operator_params("Relu", csv_path) is None
+
+
+def test_operator_type():
+    """Items are counted per section; attribute items do not count as inputs."""
+    add = "描述: add\n输入:\n  - A (类型: T)\n  - B (类型: T)\n输出:\n  - C (类型: T)\n执行单元: vector"
+    relu = "输入:\n  - X (类型: T)\n输出:\n  - Y (类型: T)\n属性:\n  - alpha (类型: float)"
+
+    assert generate_json._operator_type(add) == "binary arithmetic"
+    assert generate_json._operator_type(relu) == "unary"
+    assert generate_json._operator_type("描述: no inputs") == "others"
+
+
+def test_save_batch_result_appends_until_finalized():
+    """Each result appends a row; finalizing keeps the last row per test, sorted."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "batch_results.csv")
+        generate_json.save_batch_result(path, 2, "Relu", {}, "failed", "not_required", "test_002_Relu")
+        generate_json.save_batch_result(path, 1, "Add", {}, "success", "not_required", "test_001_Add")
+        generate_json.save_batch_result(path, 2, "Relu", {}, "success", "not_required", "test_002_Relu")
+
+        with open(path, "rb") as f:
+            content = f.read()
+        assert content.count(b"\xef\xbb\xbf") == 1
+        assert len(content.splitlines()) == 4
+
+        generate_json.finalize_batch_results(path)
+
+        results = generate_json.load_batch_results(path)
+        assert list(results) == [1, 2]
+        assert results[2]["json_status"] == "success"
+        assert results[2]["generation_count"] == "2"
+        with open(path, "rb") as f:
+            assert len(f.read().splitlines()) == 3
+
+
+def test_find_template_file_does_not_cache_misses():
+    """A template that appears after a failed lookup is found by the next one."""
+    with tempfile.TemporaryDirectory() as temp_dir, _working_directory(temp_dir), \
+            _patched(generate_json, _TEMPLATE_FILE_CACHE={}):
+        assert generate_json._find_template_file("late.prompt", temp_dir) is None
+
+        open("late.prompt", "w").close()
+        assert generate_json._find_template_file("late.prompt", temp_dir) == "late.prompt"
+
+
+def test_finalize_batch_results_with_sparse_indexes():
+    """A far-off stale index is sorted into place without walking the gap."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "batch_results.csv")
+        generate_json.save_batch_result(path, 10 ** 12, "Stale", {}, "failed", "not_required", "test_stale")
+        generate_json.save_batch_result(path, 2, "Relu", {}, "success", "not_required", "test_002_Relu")
+        generate_json.save_batch_result(path, 1, "Add", {}, "success", "not_required", "test_001_Add")
+
+        generate_json.finalize_batch_results(path)
+
+        assert list(generate_json.load_batch_results(path)) == [1, 2, 10 ** 12]
+
+
+def test_resolve_is_cached_until_directory_changes():
+    """A cached path is reused until its directory's mtime changes."""
+    calls = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        resource = os.path.join(temp_dir, "op_testcase.prompt")
+        open(resource, "w").close()
+
+        def fake_find(relative_path):
+            calls.append(relative_path)
+            return resource
+
+        with _patched(generate_json, find_resource_path=fake_find, _PATH_CACHE={}):
+            assert generate_json._resolve("prompts/op_testcase.prompt") == resource
+            assert generate_json._resolve("prompts/op_testcase.prompt") == resource
+            assert len(calls) == 1
+
+            os.utime(temp_dir, (0, 0))
+            assert generate_json._resolve("prompts/op_testcase.prompt") == resource
+            assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    test_fill_placeholders()
+    test_fill_placeholders_without_replacements()
+    test_is_retryable_request_error()
+    test_tail()
+    test_atomic_write_bytes()
+    test_fix_malformed_json()
+    test_fix_malformed_json_keeps_literals_and_strings()
+    test_fix_malformed_json_python_dict()
+    test_extract_code_blocks()
+    test_first_json_object()
+    test_iter_sse()
+    test_count_tokens_uses_sampled_ratio()
+    test_token_usage_reaches_sink()
+    test_find_operator_params_rereads_changed_csv()
+    test_operator_type()
+    test_save_batch_result_appends_until_finalized()
+    test_find_template_file_does_not_cache_misses()
+    test_finalize_batch_results_with_sparse_indexes()
+    test_resolve_is_cached_until_directory_changes()
+
+    print("\n✅ All generate_json tests completed!")